@@ -3,555 +3,617 @@ from collections.abc import Callable
 import numpy as np
 from scipy import interpolate
 
-from .typing import PathLike
+from .typing import ArrayLike, FloatArray, PathLike
 
 
-def LfuncN(T: float) -> float:
-    """Nitrogen based cooling curve used in Lipschultz 2016
+def _horner(coeffs, T):
+    """Evaluate a polynomial (highest power first, as for `numpy.polyval`)"""
+    Lz = 0.0
+    for c in coeffs:
+        Lz = Lz * T + c
+    return Lz
+
+
+def _piecewise(T, pieces):
+    """Evaluate a piecewise cooling curve, zero outside all the pieces
+
+    Scalars are branched on directly, which is much cheaper than going
+    through NumPy for the single temperatures requested by the ODE
+    solver, and arrays are evaluated piece by piece with masks.
 
     Parameters
     ----------
     T:
-        Temperature [eV]
+        Temperature [eV], scalar or array
+    pieces:
+        Sequence of ``(Tmin, Tmax, f)`` where ``f`` applies on ``Tmin <=
+        T < Tmax``. ``f`` is either a function of ``T`` or a sequence
+        of polynomial coefficients.
     """
-    if 1 <= T <= 80:
-        return (5.9e-34 * np.sqrt(T - 1)) * (80 - T) / (1 + (3.1e-3) * (T - 1) ** 2)
+    if isinstance(T, float) or np.ndim(T) == 0:
+        for Tmin, Tmax, f in pieces:
+            if Tmin <= T < Tmax:
+                return f(T) if callable(f) else _horner(f, T)
+        return 0.0
+
+    temperature = np.asarray(T, dtype=float)
+    Lz = np.zeros_like(temperature)
+    for Tmin, Tmax, f in pieces:
+        mask = (Tmin <= temperature) & (temperature < Tmax)
+        Lz[mask] = (
+            f(temperature[mask]) if callable(f) else _horner(f, temperature[mask])
+        )
+    return Lz
 
-    return 0
 
+def _closed(Tmax):
+    """Upper bound for which ``T < _closed(Tmax)`` is ``T <= Tmax``"""
+    return np.nextafter(Tmax, np.inf)
 
-def LfuncNe(T: float) -> float:
-    """Ne based cooling curve produced by Matlab polynominal curve fitting "polyval" (Ryoko 2020 Nov)
+
+def evaluate_Lfunc(Lfunc: Callable, T: ArrayLike) -> FloatArray:
+    """Evaluate a cooling curve on an array of temperatures
+
+    All the curves in this module accept arrays, so this is a single
+    vectorised call. User-supplied curves that only accept scalars are
+    evaluated point by point instead.
 
     Parameters
     ----------
+    Lfunc:
+        Cooling curve function
     T:
         Temperature [eV]
     """
-    if 3 <= T <= 100:
-        return (
-            -2.0385e-40 * T**5
-            + 5.4824e-38 * T**4
-            - 5.1190e-36 * T**3
-            + 1.7347e-34 * T**2
-            - 3.4151e-34 * T
-            - 3.2798e-34
-        )
-    if 2 <= T < 3:
-        return (8.0 - 1.0) * 1.0e-35 / (3.0 - 2.0) * (T - 2.0) + 1.0e-35
+    T = np.asarray(T, dtype=float)
+    try:
+        Lz = np.asarray(Lfunc(T), dtype=float)
+    except (TypeError, ValueError):
+        # Scalar-only function, e.g. branching on ``if T < ...``
+        Lz = None
 
-    if 1 <= T < 2:
-        return 1.0e-35 / (2.0 - 1.0) * (T - 1.0)
+    if Lz is None or Lz.shape != T.shape:
+        Lz = np.array([Lfunc(t) for t in T.ravel()], dtype=float).reshape(T.shape)
 
-    return 0
+    return Lz
 
 
-def LfuncAr(T: float) -> float:
-    """Ar based cooling curve produced by Matlab polynominal curve fitting "polyval" (Ryoko 2020 Nov)
+_N_PIECES = (
+    (
+        1,
+        _closed(80),
+        lambda T: (5.9e-34 * np.sqrt(T - 1)) * (80 - T) / (1 + (3.1e-3) * (T - 1) ** 2),
+    ),
+)
+
+
+def LfuncN(T: ArrayLike) -> FloatArray:
+    """Nitrogen based cooling curve used in Lipschultz 2016
 
     Parameters
     ----------
     T:
-        Temperature [eV]
+        Temperature [eV], scalar or array
     """
-    if 1.5 <= T <= 100:
-        return (
-            -4.9692e-48 * T**10
-            + 2.8025e-45 * T**9
-            - 6.7148e-43 * T**8
-            + 8.8636e-41 * T**7
-            - 6.9642e-39 * T**6
-            + 3.2559e-37 * T**5
-            - 8.3410e-36 * T**4
-            + 8.6011e-35 * T**3
-            + 1.9958e-34 * T**2
-            + 4.9864e-34 * T
-            - 9.9412e-34
-        )
-    if 1.0 <= T < 1.5:
-        return 2.5e-35 / (1.5 - 1.0) * (T - 1.0)
+    return _piecewise(T, _N_PIECES)
 
-    return 0
 
+_NE_PIECES = (
+    (
+        3,
+        _closed(100),
+        (-2.0385e-40, 5.4824e-38, -5.1190e-36, 1.7347e-34, -3.4151e-34, -3.2798e-34),
+    ),
+    (2, 3, lambda T: (8.0 - 1.0) * 1.0e-35 / (3.0 - 2.0) * (T - 2.0) + 1.0e-35),
+    (1, 2, lambda T: 1.0e-35 / (2.0 - 1.0) * (T - 1.0)),
+)
 
-def LfuncKallenbachN(T: float) -> float:
-    """Nitrogen, Tau = 1ms, Kallenbach 2018, xlsx from David Moulton, units W/m3
+
+def LfuncNe(T: ArrayLike) -> FloatArray:
+    """Ne based cooling curve produced by Matlab polynominal curve fitting "polyval" (Ryoko 2020 Nov)
 
     Parameters
     ----------
     T:
-        Temperature [eV]
+        Temperature [eV], scalar or array
     """
-
-    if 1 <= T < 5:
-        Lz = np.poly1d(
-            [
-                -5.21687120e-36,
-                1.60727242e-34,
-                -2.16936871e-33,
-                1.68436996e-32,
-                -8.30711894e-32,
-                2.71172761e-31,
-                -5.91964730e-31,
-                8.52020549e-31,
-                -7.72966258e-31,
-                3.98940856e-31,
-                -8.89675581e-32,
-            ]
-        )(T)
-
-    elif 5 <= T < 40:
-        Lz = np.poly1d(
-            [
-                3.26756633e-44,
-                -6.31908910e-42,
-                4.96695322e-40,
-                -1.96486884e-38,
-                3.59135813e-37,
-                3.06130853e-37,
-                -1.41905480e-34,
-                2.68984500e-33,
-                -2.32868431e-32,
-                1.04699124e-31,
-                -1.82157600e-31,
-            ]
-        )(T)
-
-    elif 40 <= T < 300:
-        Lz = np.poly1d(
-            [
-                7.54004096e-54,
-                -1.38335676e-50,
-                1.11358025e-47,
-                -5.16996208e-45,
-                1.53001408e-42,
-                -3.00995298e-40,
-                3.98008440e-38,
-                -3.49352343e-36,
-                1.95746109e-34,
-                -6.39096845e-33,
-                9.64688241e-32,
-            ]
-        )(T)
-    else:
-        Lz = 0
-
-    return np.abs(Lz)
-
-
-def LfuncKallenbachAr(T: float) -> float:
-    """Argon, Tau = 1ms, Kallenbach 2018, xlsx from David Moulton, units W/m3
+    return _piecewise(T, _NE_PIECES)
+
+
+_AR_PIECES = (
+    (
+        1.5,
+        _closed(100),
+        (
+            -4.9692e-48,
+            2.8025e-45,
+            -6.7148e-43,
+            8.8636e-41,
+            -6.9642e-39,
+            3.2559e-37,
+            -8.3410e-36,
+            8.6011e-35,
+            1.9958e-34,
+            4.9864e-34,
+            -9.9412e-34,
+        ),
+    ),
+    (1.0, 1.5, lambda T: 2.5e-35 / (1.5 - 1.0) * (T - 1.0)),
+)
+
+
+def LfuncAr(T: ArrayLike) -> FloatArray:
+    """Ar based cooling curve produced by Matlab polynominal curve fitting "polyval" (Ryoko 2020 Nov)
 
     Parameters
     ----------
     T:
-        Temperature [eV]
+        Temperature [eV], scalar or array
     """
+    return _piecewise(T, _AR_PIECES)
+
+
+_KALLENBACH_N_PIECES = (
+    (
+        1,
+        5,
+        (
+            -5.21687120e-36,
+            1.60727242e-34,
+            -2.16936871e-33,
+            1.68436996e-32,
+            -8.30711894e-32,
+            2.71172761e-31,
+            -5.91964730e-31,
+            8.52020549e-31,
+            -7.72966258e-31,
+            3.98940856e-31,
+            -8.89675581e-32,
+        ),
+    ),
+    (
+        5,
+        40,
+        (
+            3.26756633e-44,
+            -6.31908910e-42,
+            4.96695322e-40,
+            -1.96486884e-38,
+            3.59135813e-37,
+            3.06130853e-37,
+            -1.41905480e-34,
+            2.68984500e-33,
+            -2.32868431e-32,
+            1.04699124e-31,
+            -1.82157600e-31,
+        ),
+    ),
+    (
+        40,
+        300,
+        (
+            7.54004096e-54,
+            -1.38335676e-50,
+            1.11358025e-47,
+            -5.16996208e-45,
+            1.53001408e-42,
+            -3.00995298e-40,
+            3.98008440e-38,
+            -3.49352343e-36,
+            1.95746109e-34,
+            -6.39096845e-33,
+            9.64688241e-32,
+        ),
+    ),
+)
+
+
+def LfuncKallenbachN(T: ArrayLike) -> FloatArray:
+    """Nitrogen, Tau = 1ms, Kallenbach 2018, xlsx from David Moulton, units W/m3
 
-    if 1 <= T < 5:
-        Lz = np.poly1d(
-            [
-                -8.38699251e-36,
-                2.43012951e-34,
-                -3.08481223e-33,
-                2.25518662e-32,
-                -1.04944420e-31,
-                3.24121434e-31,
-                -6.71355380e-31,
-                9.19192927e-31,
-                -7.95181317e-31,
-                3.92278185e-31,
-                -8.38171132e-32,
-            ]
-        )(T)
-
-    elif 5 <= T < 40:
-        Lz = np.poly1d(
-            [
-                -2.24776575e-44,
-                5.69345397e-42,
-                -6.21765225e-40,
-                3.82394212e-38,
-                -1.45016003e-36,
-                3.48446287e-35,
-                -5.22822655e-34,
-                4.60191732e-33,
-                -2.08137220e-32,
-                4.85784218e-32,
-                -4.65352931e-32,
-            ]
-        )(T)
-
-    elif 40 <= T < 300:
-        Lz = np.poly1d(
-            [
-                1.15288779e-52,
-                -2.13319167e-49,
-                1.73237521e-46,
-                -8.11799909e-44,
-                2.42721486e-41,
-                -4.83284202e-39,
-                6.48766158e-37,
-                -5.80513398e-35,
-                3.32611538e-33,
-                -1.10748910e-31,
-                1.65113630e-30,
-            ]
-        )(T)
-
-    else:
-        Lz = 0
-
-    return np.abs(Lz)
-
-
-def LfuncKallenbachAr100B(T: float) -> float:
+    Parameters
+    ----------
+    T:
+        Temperature [eV], scalar or array
+    """
+    return abs(_piecewise(T, _KALLENBACH_N_PIECES))
+
+
+_KALLENBACH_AR_PIECES = (
+    (
+        1,
+        5,
+        (
+            -8.38699251e-36,
+            2.43012951e-34,
+            -3.08481223e-33,
+            2.25518662e-32,
+            -1.04944420e-31,
+            3.24121434e-31,
+            -6.71355380e-31,
+            9.19192927e-31,
+            -7.95181317e-31,
+            3.92278185e-31,
+            -8.38171132e-32,
+        ),
+    ),
+    (
+        5,
+        40,
+        (
+            -2.24776575e-44,
+            5.69345397e-42,
+            -6.21765225e-40,
+            3.82394212e-38,
+            -1.45016003e-36,
+            3.48446287e-35,
+            -5.22822655e-34,
+            4.60191732e-33,
+            -2.08137220e-32,
+            4.85784218e-32,
+            -4.65352931e-32,
+        ),
+    ),
+    (
+        40,
+        300,
+        (
+            1.15288779e-52,
+            -2.13319167e-49,
+            1.73237521e-46,
+            -8.11799909e-44,
+            2.42721486e-41,
+            -4.83284202e-39,
+            6.48766158e-37,
+            -5.80513398e-35,
+            3.32611538e-33,
+            -1.10748910e-31,
+            1.65113630e-30,
+        ),
+    ),
+)
+
+
+def LfuncKallenbachAr(T: ArrayLike) -> FloatArray:
     """Argon, Tau = 1ms, Kallenbach 2018, xlsx from David Moulton, units W/m3
 
     Parameters
     ----------
     T:
-        Temperature [eV]
+        Temperature [eV], scalar or array
     """
+    return abs(_piecewise(T, _KALLENBACH_AR_PIECES))
+
+
+_KALLENBACH_AR100B_HIGH_T_COEFFS = (
+    1.15288779e-52,
+    -2.13319167e-49,
+    1.73237521e-46,
+    -8.11799909e-44,
+    2.42721486e-41,
+    -4.83284202e-39,
+    6.48766158e-37,
+    -5.80513398e-35,
+    3.32611538e-33,
+    -1.10748910e-31,
+    1.65113630e-30,
+)
+
+_KALLENBACH_AR100B_PIECES = (
+    (
+        1,
+        5,
+        (
+            -8.38699251e-36,
+            2.43012951e-34,
+            -3.08481223e-33,
+            2.25518662e-32,
+            -1.04944420e-31,
+            3.24121434e-31,
+            -6.71355380e-31,
+            9.19192927e-31,
+            -7.95181317e-31,
+            3.92278185e-31,
+            -8.38171132e-32,
+        ),
+    ),
+    (
+        5,
+        40,
+        (
+            -2.24776575e-44,
+            5.69345397e-42,
+            -6.21765225e-40,
+            3.82394212e-38,
+            -1.45016003e-36,
+            3.48446287e-35,
+            -5.22822655e-34,
+            4.60191732e-33,
+            -2.08137220e-32,
+            4.85784218e-32,
+            -4.65352931e-32,
+        ),
+    ),
+    (40, 100, _KALLENBACH_AR100B_HIGH_T_COEFFS),
+    # After 100 it's constant radiation (but not 0)
+    (100, 300, (_horner(_KALLENBACH_AR100B_HIGH_T_COEFFS, 100),)),
+    (300, np.inf, (300.0,)),
+)
 
-    if 1 <= T < 5:
-        Lz = np.poly1d(
-            [
-                -8.38699251e-36,
-                2.43012951e-34,
-                -3.08481223e-33,
-                2.25518662e-32,
-                -1.04944420e-31,
-                3.24121434e-31,
-                -6.71355380e-31,
-                9.19192927e-31,
-                -7.95181317e-31,
-                3.92278185e-31,
-                -8.38171132e-32,
-            ]
-        )(T)
-
-    elif 5 <= T < 40:
-        Lz = np.poly1d(
-            [
-                -2.24776575e-44,
-                5.69345397e-42,
-                -6.21765225e-40,
-                3.82394212e-38,
-                -1.45016003e-36,
-                3.48446287e-35,
-                -5.22822655e-34,
-                4.60191732e-33,
-                -2.08137220e-32,
-                4.85784218e-32,
-                -4.65352931e-32,
-            ]
-        )(T)
-
-    elif 40 <= T < 100:
-        Lz = np.poly1d(
-            [
-                1.15288779e-52,
-                -2.13319167e-49,
-                1.73237521e-46,
-                -8.11799909e-44,
-                2.42721486e-41,
-                -4.83284202e-39,
-                6.48766158e-37,
-                -5.80513398e-35,
-                3.32611538e-33,
-                -1.10748910e-31,
-                1.65113630e-30,
-            ]
-        )(T)
 
-    # After 100 it's constant radiation (but not 0)
-    elif 100 <= T < 300:
-        Lz = np.poly1d(
-            [
-                1.15288779e-52,
-                -2.13319167e-49,
-                1.73237521e-46,
-                -8.11799909e-44,
-                2.42721486e-41,
-                -4.83284202e-39,
-                6.48766158e-37,
-                -5.80513398e-35,
-                3.32611538e-33,
-                -1.10748910e-31,
-                1.65113630e-30,
-            ]
-        )(100)
-    elif T >= 300:
-        Lz = 300
-    else:
-        Lz = 0
-
-    return np.abs(Lz)
-
-
-def LfuncKallenbachAr200(T: float) -> float:
+def LfuncKallenbachAr100B(T: ArrayLike) -> FloatArray:
     """Argon, Tau = 1ms, Kallenbach 2018, xlsx from David Moulton, units W/m3
 
     Parameters
     ----------
     T:
-        Temperature [eV]
+        Temperature [eV], scalar or array
     """
-
-    if 1 <= T < 5:
-        Lz = np.poly1d(
-            [
-                -8.38699251e-36,
-                2.43012951e-34,
-                -3.08481223e-33,
-                2.25518662e-32,
-                -1.04944420e-31,
-                3.24121434e-31,
-                -6.71355380e-31,
-                9.19192927e-31,
-                -7.95181317e-31,
-                3.92278185e-31,
-                -8.38171132e-32,
-            ]
-        )(T)
-
-    elif 5 <= T < 40:
-        Lz = np.poly1d(
-            [
-                -2.24776575e-44,
-                5.69345397e-42,
-                -6.21765225e-40,
-                3.82394212e-38,
-                -1.45016003e-36,
-                3.48446287e-35,
-                -5.22822655e-34,
-                4.60191732e-33,
-                -2.08137220e-32,
-                4.85784218e-32,
-                -4.65352931e-32,
-            ]
-        )(T)
-
-    elif 40 <= T < 200:
-        Lz = np.poly1d(
-            [
-                1.15288779e-52,
-                -2.13319167e-49,
-                1.73237521e-46,
-                -8.11799909e-44,
-                2.42721486e-41,
-                -4.83284202e-39,
-                6.48766158e-37,
-                -5.80513398e-35,
-                3.32611538e-33,
-                -1.10748910e-31,
-                1.65113630e-30,
-            ]
-        )(T)
-
-    else:
-        Lz = 0
-
-    return np.abs(Lz)
-
-
-def LfuncKallenbachAr100(T: float) -> float:
+    return abs(_piecewise(T, _KALLENBACH_AR100B_PIECES))
+
+
+_KALLENBACH_AR200_PIECES = (
+    (
+        1,
+        5,
+        (
+            -8.38699251e-36,
+            2.43012951e-34,
+            -3.08481223e-33,
+            2.25518662e-32,
+            -1.04944420e-31,
+            3.24121434e-31,
+            -6.71355380e-31,
+            9.19192927e-31,
+            -7.95181317e-31,
+            3.92278185e-31,
+            -8.38171132e-32,
+        ),
+    ),
+    (
+        5,
+        40,
+        (
+            -2.24776575e-44,
+            5.69345397e-42,
+            -6.21765225e-40,
+            3.82394212e-38,
+            -1.45016003e-36,
+            3.48446287e-35,
+            -5.22822655e-34,
+            4.60191732e-33,
+            -2.08137220e-32,
+            4.85784218e-32,
+            -4.65352931e-32,
+        ),
+    ),
+    (
+        40,
+        200,
+        (
+            1.15288779e-52,
+            -2.13319167e-49,
+            1.73237521e-46,
+            -8.11799909e-44,
+            2.42721486e-41,
+            -4.83284202e-39,
+            6.48766158e-37,
+            -5.80513398e-35,
+            3.32611538e-33,
+            -1.10748910e-31,
+            1.65113630e-30,
+        ),
+    ),
+)
+
+
+def LfuncKallenbachAr200(T: ArrayLike) -> FloatArray:
     """Argon, Tau = 1ms, Kallenbach 2018, xlsx from David Moulton, units W/m3
 
     Parameters
     ----------
     T:
-        Temperature [eV]
+        Temperature [eV], scalar or array
     """
-
-    if 1 <= T < 5:
-        Lz = np.poly1d(
-            [
-                -8.38699251e-36,
-                2.43012951e-34,
-                -3.08481223e-33,
-                2.25518662e-32,
-                -1.04944420e-31,
-                3.24121434e-31,
-                -6.71355380e-31,
-                9.19192927e-31,
-                -7.95181317e-31,
-                3.92278185e-31,
-                -8.38171132e-32,
-            ]
-        )(T)
-
-    elif 5 <= T < 40:
-        Lz = np.poly1d(
-            [
-                -2.24776575e-44,
-                5.69345397e-42,
-                -6.21765225e-40,
-                3.82394212e-38,
-                -1.45016003e-36,
-                3.48446287e-35,
-                -5.22822655e-34,
-                4.60191732e-33,
-                -2.08137220e-32,
-                4.85784218e-32,
-                -4.65352931e-32,
-            ]
-        )(T)
-
-    elif 40 <= T < 100:
-        Lz = np.poly1d(
-            [
-                1.15288779e-52,
-                -2.13319167e-49,
-                1.73237521e-46,
-                -8.11799909e-44,
-                2.42721486e-41,
-                -4.83284202e-39,
-                6.48766158e-37,
-                -5.80513398e-35,
-                3.32611538e-33,
-                -1.10748910e-31,
-                1.65113630e-30,
-            ]
-        )(T)
-
-    else:
-        Lz = 0
-
-    return np.abs(Lz)
-
-
-def LfuncKallenbachAr150(T: float) -> float:
+    return abs(_piecewise(T, _KALLENBACH_AR200_PIECES))
+
+
+_KALLENBACH_AR100_PIECES = (
+    (
+        1,
+        5,
+        (
+            -8.38699251e-36,
+            2.43012951e-34,
+            -3.08481223e-33,
+            2.25518662e-32,
+            -1.04944420e-31,
+            3.24121434e-31,
+            -6.71355380e-31,
+            9.19192927e-31,
+            -7.95181317e-31,
+            3.92278185e-31,
+            -8.38171132e-32,
+        ),
+    ),
+    (
+        5,
+        40,
+        (
+            -2.24776575e-44,
+            5.69345397e-42,
+            -6.21765225e-40,
+            3.82394212e-38,
+            -1.45016003e-36,
+            3.48446287e-35,
+            -5.22822655e-34,
+            4.60191732e-33,
+            -2.08137220e-32,
+            4.85784218e-32,
+            -4.65352931e-32,
+        ),
+    ),
+    (
+        40,
+        100,
+        (
+            1.15288779e-52,
+            -2.13319167e-49,
+            1.73237521e-46,
+            -8.11799909e-44,
+            2.42721486e-41,
+            -4.83284202e-39,
+            6.48766158e-37,
+            -5.80513398e-35,
+            3.32611538e-33,
+            -1.10748910e-31,
+            1.65113630e-30,
+        ),
+    ),
+)
+
+
+def LfuncKallenbachAr100(T: ArrayLike) -> FloatArray:
     """Argon, Tau = 1ms, Kallenbach 2018, xlsx from David Moulton, units W/m3
 
     Parameters
     ----------
     T:
-        Temperature [eV]
+        Temperature [eV], scalar or array
     """
+    return abs(_piecewise(T, _KALLENBACH_AR100_PIECES))
+
+
+_KALLENBACH_AR150_PIECES = (
+    (
+        1,
+        5,
+        (
+            -8.38699251e-36,
+            2.43012951e-34,
+            -3.08481223e-33,
+            2.25518662e-32,
+            -1.04944420e-31,
+            3.24121434e-31,
+            -6.71355380e-31,
+            9.19192927e-31,
+            -7.95181317e-31,
+            3.92278185e-31,
+            -8.38171132e-32,
+        ),
+    ),
+    (
+        5,
+        40,
+        (
+            -2.24776575e-44,
+            5.69345397e-42,
+            -6.21765225e-40,
+            3.82394212e-38,
+            -1.45016003e-36,
+            3.48446287e-35,
+            -5.22822655e-34,
+            4.60191732e-33,
+            -2.08137220e-32,
+            4.85784218e-32,
+            -4.65352931e-32,
+        ),
+    ),
+    (
+        40,
+        150,
+        (
+            1.15288779e-52,
+            -2.13319167e-49,
+            1.73237521e-46,
+            -8.11799909e-44,
+            2.42721486e-41,
+            -4.83284202e-39,
+            6.48766158e-37,
+            -5.80513398e-35,
+            3.32611538e-33,
+            -1.10748910e-31,
+            1.65113630e-30,
+        ),
+    ),
+)
+
+
+def LfuncKallenbachAr150(T: ArrayLike) -> FloatArray:
+    """Argon, Tau = 1ms, Kallenbach 2018, xlsx from David Moulton, units W/m3
 
-    if 1 <= T < 5:
-        Lz = np.poly1d(
-            [
-                -8.38699251e-36,
-                2.43012951e-34,
-                -3.08481223e-33,
-                2.25518662e-32,
-                -1.04944420e-31,
-                3.24121434e-31,
-                -6.71355380e-31,
-                9.19192927e-31,
-                -7.95181317e-31,
-                3.92278185e-31,
-                -8.38171132e-32,
-            ]
-        )(T)
-
-    elif 5 <= T < 40:
-        Lz = np.poly1d(
-            [
-                -2.24776575e-44,
-                5.69345397e-42,
-                -6.21765225e-40,
-                3.82394212e-38,
-                -1.45016003e-36,
-                3.48446287e-35,
-                -5.22822655e-34,
-                4.60191732e-33,
-                -2.08137220e-32,
-                4.85784218e-32,
-                -4.65352931e-32,
-            ]
-        )(T)
-
-    elif 40 <= T < 150:
-        Lz = np.poly1d(
-            [
-                1.15288779e-52,
-                -2.13319167e-49,
-                1.73237521e-46,
-                -8.11799909e-44,
-                2.42721486e-41,
-                -4.83284202e-39,
-                6.48766158e-37,
-                -5.80513398e-35,
-                3.32611538e-33,
-                -1.10748910e-31,
-                1.65113630e-30,
-            ]
-        )(T)
-
-    else:
-        Lz = 0
-
-    return np.abs(Lz)
-
-
-def LfuncKallenbachNe(T: float) -> float:
+    Parameters
+    ----------
+    T:
+        Temperature [eV], scalar or array
+    """
+    return abs(_piecewise(T, _KALLENBACH_AR150_PIECES))
+
+
+_KALLENBACH_NE_PIECES = (
+    (
+        1,
+        5,
+        (
+            -7.31349415e-38,
+            1.93202142e-36,
+            -2.22916113e-35,
+            1.47759381e-34,
+            -6.22728157e-34,
+            1.74652508e-33,
+            -3.31631764e-33,
+            4.24000336e-33,
+            -3.51509184e-33,
+            1.71002985e-33,
+            -3.69832235e-34,
+        ),
+    ),
+    (
+        5,
+        40,
+        (
+            2.29496770e-45,
+            -8.10783697e-43,
+            1.11804695e-40,
+            -8.26465601e-39,
+            3.68332021e-37,
+            -1.03900422e-35,
+            1.87877062e-34,
+            -2.15159577e-33,
+            1.50337186e-32,
+            -5.65180585e-32,
+            8.64376408e-32,
+        ),
+    ),
+    (
+        40,
+        300,
+        (
+            2.25354957e-53,
+            -3.69192130e-50,
+            2.54787258e-47,
+            -9.47932318e-45,
+            1.97532243e-42,
+            -1.94373386e-40,
+            -4.50456808e-39,
+            3.41720857e-36,
+            -3.67272828e-34,
+            1.62817217e-32,
+            -2.03213689e-31,
+        ),
+    ),
+)
+
+
+def LfuncKallenbachNe(T: ArrayLike) -> FloatArray:
     """Neon, Tau = 1ms, Kallenbach 2018, xlsx from David Moulton, units W/m3
 
     Parameters
     ----------
     T:
-        Temperature [eV]
+        Temperature [eV], scalar or array
     """
-
-    if 1 <= T < 5:
-        Lz = np.poly1d(
-            [
-                -7.31349415e-38,
-                1.93202142e-36,
-                -2.22916113e-35,
-                1.47759381e-34,
-                -6.22728157e-34,
-                1.74652508e-33,
-                -3.31631764e-33,
-                4.24000336e-33,
-                -3.51509184e-33,
-                1.71002985e-33,
-                -3.69832235e-34,
-            ]
-        )(T)
-
-    elif 5 <= T < 40:
-        Lz = np.poly1d(
-            [
-                2.29496770e-45,
-                -8.10783697e-43,
-                1.11804695e-40,
-                -8.26465601e-39,
-                3.68332021e-37,
-                -1.03900422e-35,
-                1.87877062e-34,
-                -2.15159577e-33,
-                1.50337186e-32,
-                -5.65180585e-32,
-                8.64376408e-32,
-            ]
-        )(T)
-
-    elif 40 <= T < 300:
-        Lz = np.poly1d(
-            [
-                2.25354957e-53,
-                -3.69192130e-50,
-                2.54787258e-47,
-                -9.47932318e-45,
-                1.97532243e-42,
-                -1.94373386e-40,
-                -4.50456808e-39,
-                3.41720857e-36,
-                -3.67272828e-34,
-                1.62817217e-32,
-                -2.03213689e-31,
-            ]
-        )(T)
-
-    else:
-        Lz = 0
-
-    return np.abs(Lz)
+    return abs(_piecewise(T, _KALLENBACH_NE_PIECES))
 
 
 def LfuncKallenbach(species_choice: str) -> Callable[[float], float]:
@@ -1,8 +1,9 @@
 import numpy as np
-from scipy.integrate import quad, trapezoid
+from scipy.integrate import cumulative_trapezoid, quad, trapezoid
 from scipy.interpolate import interp1d
 
 from .AnalyticCoolingCurves import LfuncN
+from .CoolingCurveTable import cooling_curve_integral
 
 
 def CfInt(spar, B_field, sx, L, sh=0, kappa1=2500):
@@ -36,10 +37,69 @@ def CfInt(spar, B_field, sx, L, sh=0, kappa1=2500):
     # account for flux expansion effects on heat flux density
     Cf = Tu * B_field(sh) / B_field(sx)
     # account for constants related to total impurity radiation
-    T = np.linspace(0, 100, 1000)
-    Q = np.array([LfuncN(t) for t in T])
-    C0 = 1.0 / np.sqrt(2 * kappa1 * trapezoid(Q * np.sqrt(T), T))
-    return Cf * C0
+    return Cf * _C0(LfuncN, kappa1)
+
+
+def CfInt_array(spar, B_field, sx, L, sh_array, Lfunc=LfuncN, kappa1=2500, n=10000):
+    """`CfInt` for many front positions at once
+
+    Rather than integrating separately for each front position, the
+    integral up to the X-point comes from one cumulative trapezoidal
+    integral on a grid of ``n`` points, which also includes every front
+    position. The integral above the X-point doesn't depend on the front
+    position, so is only done once.
+
+    Parameters
+    ----------
+    spar: array, m
+        Array of S parallel
+    B_field: array, T
+        Array of total B field
+    sx: float, m
+        Position of detachment front in the parallel
+    L: float, m
+        Connection length in the parallel
+    sh_array: array, m
+        Parallel front positions
+    Lfunc: callable
+        Cooling curve function
+    kappa1: float, W/m^2/K^7/2
+        Electron thermal conductivity
+    n: int
+        Number of points in the integration grids
+
+    """
+    sh_array = np.asarray(sh_array, dtype=float)
+    B_field = interp1d(spar, B_field, kind="cubic", fill_value="extrapolate")
+    Bx = B_field(sx)
+
+    # calculate Tu/qpll**(2/7) by integrating over heat flux density
+    s = np.unique(
+        np.concatenate(
+            [
+                np.linspace(min(sh_array.min(), sx), max(sh_array.max(), sx), n),
+                sh_array,
+                [sx],
+            ]
+        )
+    )
+    integral = cumulative_trapezoid(B_field(s) / Bx, s, initial=0)
+    Tu = integral[np.searchsorted(s, sx)] - integral[np.searchsorted(s, sh_array)]
+    if sx < L:
+        s = np.linspace(sx, L, n)
+        Tu += trapezoid((L - s) * (B_field(s) / Bx) / (L - sx), s)
+    Tu = (Tu * 7 / (2 * kappa1)) ** (-2 / 7)
+    # account for flux expansion effects on heat flux density
+    Cf = Tu * B_field(sh_array) / Bx
+    # account for constants related to total impurity radiation
+    return Cf * _C0(Lfunc, kappa1)
+
+
+def _C0(Lfunc, kappa1):
+    """Impurity radiation constant of `CfInt`, from the integral of the
+    cooling curve up to 100 eV, which is memoised per cooling curve"""
+    _, integralinterp = cooling_curve_integral(Lfunc, Tmin=0, Tmax=100, n=1000)
+    return 1.0 / np.sqrt(2 * kappa1 * integralinterp(100))
 
 
 def _integrand(s, sx, B_field):
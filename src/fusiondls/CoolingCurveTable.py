@@ -0,0 +1,343 @@
+import math
+from collections.abc import Callable, Hashable
+from functools import lru_cache
+
+import numpy as np
+from scipy import interpolate
+from scipy.integrate import cumulative_trapezoid
+
+from .AnalyticCoolingCurves import evaluate_Lfunc
+from .typing import ArrayLike, FloatArray
+
+# Interior Chebyshev points on [0, 1] used to fit each cell. Keeping them
+# off the cell edges means a jump in the cooling curve that sits on a grid
+# node (the fits all switch polynomial at integer temperatures) is never
+# smeared across a cell.
+_FIT_POINTS = 0.5 * (1 - np.cos((2 * np.arange(4) + 1) * np.pi / 8))
+_FIT_MATRIX = np.linalg.inv(np.vander(_FIT_POINTS, 4, increasing=True))
+
+# Points between the fitting points, where the table is checked
+_CHECK_POINTS = np.array([0.25, 0.5, 0.75])
+
+# Cells the cubics can't resolve are split into _SUB_CELLS cells spaced
+# geometrically from their lower edge, down to exp(-_SUB_RANGE) of their
+# width above it. A curve which switches on at a node like sqrt(T - T0),
+# as LfuncN does, is smooth in each of these
+_SUB_CELLS = 128
+_SUB_RANGE = 30.0
+
+# Values smaller than this fraction of the peak count as this size when
+# measuring the relative error, so zero crossings and onsets don't dominate
+_RELATIVE_FLOOR = 1e-2
+
+# Number of cooling curves kept by the memoised tables below. Each table is
+# a couple of MB, and parameter scans typically use only one or two curves
+_CACHE_SIZE = 16
+
+
+class CoolingCurveTable:
+    """Tabulated cooling curve for fast repeated evaluation
+
+    The cooling curve ``Lfunc`` is sampled once on a uniform (or
+    log-uniform) grid in temperature, and each cell stores the
+    coefficients of a local cubic. Cells where the cubic is off by more
+    than ``refine_tol`` of the peak, such as where the curve switches on
+    like a square root, are split into cells spaced geometrically from
+    their lower edge. Evaluation is then an O(1) index lookup (two in a
+    split cell) and a cubic, regardless of how expensive ``Lfunc`` is.
+    Temperatures outside ``[Tmin, Tmax)`` are passed through to
+    ``Lfunc``.
+
+    Parameters
+    ----------
+    Lfunc:
+        Cooling curve function, scalar-only or vectorised
+    Tmin:
+        Lowest tabulated temperature [eV]. Must be positive if
+        ``spacing="log"``
+    Tmax:
+        Highest tabulated temperature [eV]
+    n:
+        Number of cells
+    spacing:
+        ``"linear"`` or ``"log"``
+    refine_tol:
+        Error relative to the peak above which a cell is split
+
+    Attributes
+    ----------
+    max_error_vs_peak:
+        Maximum difference between the table and ``Lfunc``, relative to
+        the peak of ``Lfunc`` over the table (not to ``Lfunc`` at the same
+        temperature), measured between the fitting points inside every
+        cell
+    max_relative_error:
+        Maximum difference between the table and ``Lfunc`` relative to
+        ``Lfunc`` at the same temperature, at the same points. Where
+        ``Lfunc`` is below 1% of its peak, the difference is taken
+        relative to 1% of the peak instead
+    """
+
+    def __init__(
+        self,
+        Lfunc: Callable,
+        Tmin: float = 0.0,
+        Tmax: float = 500.0,
+        n: int = 10000,
+        spacing: str = "linear",
+        refine_tol: float = 1e-6,
+    ):
+        if spacing not in {"linear", "log"}:
+            raise ValueError(f"spacing must be 'linear' or 'log', got '{spacing}'")
+        if spacing == "log" and Tmin <= 0:
+            raise ValueError("Tmin must be positive for log spacing")
+        if Tmax <= Tmin:
+            raise ValueError("Tmax must be greater than Tmin")
+
+        self.Lfunc = Lfunc
+        self.Tmin = Tmin
+        self.Tmax = Tmax
+        self.n = n
+        self.spacing = spacing
+        self._log = spacing == "log"
+
+        # Map from T to the continuous cell coordinate x = x0 + T * scale
+        # (or log(T) for log spacing), so that cell i is [i, i+1)
+        if spacing == "linear":
+            self._scale = n / (Tmax - Tmin)
+            self._x0 = -Tmin * self._scale
+        else:
+            self._scale = n / np.log(Tmax / Tmin)
+            self._x0 = -np.log(Tmin) * self._scale
+
+        # Fit a cubic in the local coordinate t = x - i to each cell
+        x_fit = np.arange(n)[:, None] + _FIT_POINTS[None, :]
+        L_fit = evaluate_Lfunc(Lfunc, self._T_from_x(x_fit))
+        self.coeffs = L_fit @ _FIT_MATRIX.T  # shape (n, 4), lowest power first
+
+        # Check against the source function at points the fit did not use
+        T_check = self._T_from_x(np.arange(n)[:, None] + _CHECK_POINTS[None, :])
+        L_check = evaluate_Lfunc(Lfunc, T_check)
+        peak = max(np.max(np.abs(L_check)), np.max(np.abs(L_fit)))
+        powers = np.vander(_CHECK_POINTS, 4, increasing=True)
+        cell_error = np.max(np.abs(self.coeffs @ powers.T - L_check), axis=1)
+
+        # Split the cells which are off by too much, numbering them in
+        # sub_index (-1 for the rest), with their lower edges and widths
+        refine = np.flatnonzero(cell_error > refine_tol * peak)
+        edges = self._T_from_x(np.arange(n + 1))
+        self.sub_index = np.full(n, -1)
+        self.sub_index[refine] = np.arange(len(refine))
+        self.sub_lower = edges[refine]
+        self.sub_width = edges[refine + 1] - edges[refine]
+        v_fit = np.arange(_SUB_CELLS)[:, None] + _FIT_POINTS[None, :]
+        L_sub = evaluate_Lfunc(Lfunc, self._T_from_v(np.arange(len(refine)), v_fit))
+        self.sub_coeffs = (L_sub @ _FIT_MATRIX.T).reshape(-1, 4)
+
+        # Python floats for the scalar path, which avoids NumPy overhead.
+        # Split cells are None, to look up in _sub_coeffs_list instead
+        self._coeffs_list = [tuple(c) for c in self.coeffs.tolist()]
+        for i in refine:
+            self._coeffs_list[i] = None
+        self._sub_coeffs_list = [tuple(c) for c in self.sub_coeffs.tolist()]
+        self._sub_edges_list = list(
+            zip(self.sub_lower.tolist(), self.sub_width.tolist())
+        )
+
+        # Check the split cells as well
+        v_check = np.arange(_SUB_CELLS)[:, None] + _CHECK_POINTS[None, :]
+        T_check = np.concatenate(
+            [
+                T_check.ravel(),
+                self._T_from_v(np.arange(len(refine)), v_check).ravel(),
+            ]
+        )
+        L_check = evaluate_Lfunc(Lfunc, T_check)
+        error = np.abs(self(T_check) - L_check)
+        if peak > 0:
+            self.max_error_vs_peak = float(np.max(error) / peak)
+            self.max_relative_error = float(
+                np.max(error / np.maximum(np.abs(L_check), _RELATIVE_FLOOR * peak))
+            )
+        else:
+            self.max_error_vs_peak = self.max_relative_error = 0.0
+
+    def _T_from_x(self, x):
+        T = (x - self._x0) / self._scale
+        return np.exp(T) if self._log else T
+
+    def _x_from_T(self, T):
+        return self._x0 + (np.log(T) if self._log else T) * self._scale
+
+    def _T_from_v(self, j, v):
+        """Temperature at coordinate v in [0, _SUB_CELLS] of split cell j"""
+        distance = np.exp(v * (_SUB_RANGE / _SUB_CELLS) - _SUB_RANGE)
+        j = np.asarray(j)[(...,) + (None,) * np.ndim(v)]
+        return self.sub_lower[j] + self.sub_width[j] * distance
+
+    def _sub_cell(self, T, j):
+        """Coefficients of the cubic at a single T in split cell j, and the
+        local coordinate t and dt/dT there"""
+        lower, width = self._sub_edges_list[j]
+        # Any closer to the lower edge is treated as the start of the cells
+        distance = max(T - lower, width * math.exp(-_SUB_RANGE))
+        v = (math.log(distance / width) + _SUB_RANGE) * (_SUB_CELLS / _SUB_RANGE)
+        k = min(int(v), _SUB_CELLS - 1)
+        dvdT = _SUB_CELLS / _SUB_RANGE / distance
+        return self._sub_coeffs_list[j * _SUB_CELLS + k], v - k, dvdT
+
+    def __call__(self, T: ArrayLike) -> FloatArray:
+        """Evaluate the cooling curve at temperature ``T`` [eV]"""
+        if isinstance(T, float) or np.ndim(T) == 0:
+            if self.Tmin <= T < self.Tmax:
+                x = self._x0 + (math.log(T) if self._log else T) * self._scale
+                i = min(int(x), self.n - 1)
+                cell = self._coeffs_list[i]
+                if cell is None:
+                    cell, t, _ = self._sub_cell(T, self.sub_index[i])
+                else:
+                    t = x - i
+                a, b, c, d = cell
+                return a + t * (b + t * (c + t * d))
+            return self.Lfunc(T)
+
+        temperature = np.asarray(T, dtype=float)
+        Lz = np.empty_like(temperature)
+        inside = (self.Tmin <= temperature) & (temperature < self.Tmax)
+
+        x = self._x_from_T(temperature[inside])
+        i = np.minimum(x.astype(int), self.n - 1)
+        t = x - i
+        coeffs = self.coeffs[i]
+
+        j = self.sub_index[i]
+        split = j >= 0
+        if np.any(split):
+            lower, width = self.sub_lower[j[split]], self.sub_width[j[split]]
+            distance = np.maximum(
+                temperature[inside][split] - lower, width * np.exp(-_SUB_RANGE)
+            )
+            v = (np.log(distance / width) + _SUB_RANGE) * (_SUB_CELLS / _SUB_RANGE)
+            k = np.minimum(v.astype(int), _SUB_CELLS - 1)
+            coeffs[split] = self.sub_coeffs[j[split] * _SUB_CELLS + k]
+            t[split] = v - k
+
+        a, b, c, d = coeffs.T
+        Lz[inside] = a + t * (b + t * (c + t * d))
+
+        if not np.all(inside):
+            Lz[~inside] = evaluate_Lfunc(self.Lfunc, temperature[~inside])
+        return Lz
+
+    def derivative(self, T: float) -> float:
+        """Derivative of the cooling curve with respect to temperature at a
+        single ``T`` [eV], from the cubic of its cell. Outside the table this
+        is a central difference of ``Lfunc``"""
+        if self.Tmin <= T < self.Tmax:
+            x = self._x0 + (math.log(T) if self._log else T) * self._scale
+            i = min(int(x), self.n - 1)
+            cell = self._coeffs_list[i]
+            if cell is None:
+                j = self.sub_index[i]
+                lower, width = self._sub_edges_list[j]
+                if T - lower <= width * math.exp(-_SUB_RANGE):
+                    # On the lower edge, where the cubics in log(T - lower)
+                    # have no useful slope
+                    return lfunc_derivative(self.Lfunc, T)
+                cell, t, dtdT = self._sub_cell(T, j)
+            else:
+                t, dtdT = x - i, self._scale / (T if self._log else 1)
+            _, b, c, d = cell
+            return (b + t * (2 * c + t * 3 * d)) * dtdT
+        return lfunc_derivative(self.Lfunc, T)
+
+    def __repr__(self):
+        return (
+            f"CoolingCurveTable({getattr(self.Lfunc, '__name__', self.Lfunc)}, "
+            f"Tmin={self.Tmin}, Tmax={self.Tmax}, n={self.n}, "
+            f"spacing='{self.spacing}', max_error_vs_peak={self.max_error_vs_peak:.1e}, "
+            f"max_relative_error={self.max_relative_error:.1e})"
+        )
+
+
+def lfunc_derivative(Lfunc: Callable, T: float, dT: float = 1e-4) -> float:
+    """Derivative of a cooling curve at a single ``T`` [eV], using the
+    table's cubics for a `CoolingCurveTable` and otherwise a central
+    difference over ``dT`` [eV]"""
+    if isinstance(Lfunc, CoolingCurveTable):
+        return Lfunc.derivative(T)
+    return (Lfunc(T + dT) - Lfunc(T - dT)) / (2 * dT)
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def _cooling_curve_table(Lfunc, Tmin, Tmax, n, spacing):
+    return CoolingCurveTable(Lfunc, Tmin=Tmin, Tmax=Tmax, n=n, spacing=spacing)
+
+
+def cooling_curve_table(
+    Lfunc: Callable,
+    Tmin: float = 0.0,
+    Tmax: float = 500.0,
+    n: int = 10000,
+    spacing: str = "linear",
+) -> CoolingCurveTable:
+    """Memoised `CoolingCurveTable`
+
+    Tables are cached per process on the identity of ``Lfunc`` and the
+    table parameters, so repeated calls to `run_dls` with the same
+    cooling curve only pay for building the table once. Unhashable
+    ``Lfunc`` are tabulated afresh each time.
+
+    Parameters are as for `CoolingCurveTable`.
+    """
+    if not isinstance(Lfunc, Hashable):
+        return CoolingCurveTable(Lfunc, Tmin=Tmin, Tmax=Tmax, n=n, spacing=spacing)
+    return _cooling_curve_table(Lfunc, Tmin, Tmax, n, spacing)
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def _cooling_curve_integral(Lfunc, Tmin, Tmax, n):
+    Tcool = np.linspace(Tmin, Tmax, n)
+    Lalpha = evaluate_Lfunc(Lfunc, Tcool)
+    Tcool = np.append(0, Tcool)
+    Lalpha = np.append(0, Lalpha)
+
+    Lint = cumulative_trapezoid(Lalpha * np.sqrt(Tcool), Tcool, initial=0)
+
+    # These are shared between callers, so make sure nobody modifies them
+    for array in (Tcool, Lalpha, Lint):
+        array.flags.writeable = False
+
+    return [Tcool, Lalpha], interpolate.interp1d(Tcool, Lint)
+
+
+def cooling_curve_integral(
+    Lfunc: Callable, Tmin: float = 0.3, Tmax: float = 500.0, n: int = 1000
+):
+    r"""Memoised cooling curve samples and their integral
+    :math:`\int_0^T L(T') \sqrt{T'} dT'`, used for the Lengyel estimates
+    of the control variable
+
+    Cached in the same way as `cooling_curve_table`.
+
+    Parameters
+    ----------
+    Lfunc:
+        Cooling curve function
+    Tmin:
+        Lowest sampled temperature [eV]. A point at 0 eV is always added
+    Tmax:
+        Highest sampled temperature [eV]
+    n:
+        Number of samples between ``Tmin`` and ``Tmax``
+
+    Returns
+    -------
+    Lz:
+        ``[T, L]``, the sampled temperatures [eV] and cooling values
+    integralinterp:
+        Linear interpolator of the integral as a function of temperature
+    """
+    if not isinstance(Lfunc, Hashable):
+        return _cooling_curve_integral.__wrapped__(Lfunc, Tmin, Tmax, n)
+    return _cooling_curve_integral(Lfunc, Tmin, Tmax, n)
@@ -0,0 +1,73 @@
+from bisect import bisect_right
+
+import numpy as np
+from scipy import interpolate
+
+from .typing import ArrayLike, FloatArray
+
+
+class FieldInterpolator:
+    """Cubic interpolator for the magnetic field along the field line
+
+    This is the same not-a-knot cubic spline as
+    ``interp1d(S, Btot, kind="cubic")``, but stored as per-interval
+    polynomial coefficients so that it's cheap to evaluate one point at a
+    time from the ODE right-hand side. The interval found by the last
+    scalar lookup is remembered, so the monotone sweep of the integrator
+    along ``S`` usually needs no search at all.
+
+    Positions outside the grid are clamped to its ends.
+
+    Parameters
+    ----------
+    S:
+        Parallel distance [m], strictly increasing
+    Btot:
+        Total B field [T]
+    """
+
+    def __init__(self, S: ArrayLike, Btot: ArrayLike):
+        S = np.asarray(S, dtype=float)
+        spline = interpolate.CubicSpline(S, np.asarray(Btot, dtype=float))
+
+        self.S = S
+        self.coeffs = spline.c.T  # shape (len(S) - 1, 4), highest power first
+
+        # Python types for the scalar path, which avoids NumPy overhead
+        self._S = S.tolist()
+        self._coeffs = [tuple(c) for c in self.coeffs.tolist()]
+        self._last = 0
+
+    def scalar(self, s: float) -> float:
+        """Evaluate at a single position ``s``"""
+        S = self._S
+        if s <= S[0]:
+            i = 0
+            s = S[0]
+        elif s >= S[-1]:
+            i = len(S) - 2
+            s = S[-1]
+        else:
+            i = self._last
+            if not S[i] <= s < S[i + 1]:
+                # Usually the integrator has just moved into the next cell
+                if i + 2 < len(S) and S[i + 1] <= s < S[i + 2]:
+                    i += 1
+                else:
+                    i = bisect_right(S, s) - 1
+            self._last = i
+
+        ds = s - S[i]
+        a, b, c, d = self._coeffs[i]
+        return ((a * ds + b) * ds + c) * ds + d
+
+    def __call__(self, s: ArrayLike) -> FloatArray:
+        """Evaluate at position(s) ``s`` [m]"""
+        if isinstance(s, float) or np.ndim(s) == 0:
+            return self.scalar(float(s))
+
+        s = np.clip(np.asarray(s, dtype=float), self.S[0], self.S[-1])
+        i = np.clip(np.searchsorted(self.S, s, side="right") - 1, 0, len(self.S) - 2)
+        ds = s - self.S[i]
+        a, b, c, d = self.coeffs[i].T
+        return ((a * ds + b) * ds + c) * ds + d
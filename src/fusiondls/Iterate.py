@@ -1,5 +1,10 @@
+import math
+
 import numpy as np
-from scipy.integrate import solve_ivp, trapezoid
+from scipy import interpolate
+from scipy.integrate import solve_ivp
+
+from .CoolingCurveTable import lfunc_derivative
 
 
 def LengFunc(s, y, si, st):
@@ -25,7 +30,7 @@ def LengFunc(s, y, si, st):
     """
 
     qoverB, T = y
-    fieldValue = si.B(np.clip(s, si.S[0], si.S[-1]))
+    fieldValue = si.B.scalar(s)  # Clamped to the grid ends
 
     # add a constant radial source of heat above the X point, which is qradial = qpll at Xpoint/np.abs(S[-1]-S[Xpoint]
     # i.e. radial heat entering SOL evenly spread between midplane and xpoint needs to be sufficient to get the
@@ -35,7 +40,7 @@ def LengFunc(s, y, si, st):
     # dqoverBds = dqoverBds/fieldValue
     dqoverBds = ((st.nu**2 * st.Tu**2) / T**2) * st.cz * si.Lfunc(T) / fieldValue
 
-    if si.radios["upstreamGrid"] and s > si.S[si.Xpoint]:
+    if si.radios["upstreamGrid"] and s > si.geometry.Sx:
         # The second term here converts the x point qpar to a radial heat source acting between midplane and the xpoint
         # account for flux expansion to Xpoint
         dqoverBds -= st.qradial / fieldValue
@@ -45,11 +50,130 @@ def LengFunc(s, y, si, st):
     return [dqoverBds, dtds]
 
 
+def LengFuncJacobian(s, y, si, st):
+    """
+    Jacobian of LengFunc with respect to (q/B, T), for the implicit
+    solvers of solve_ivp. The cooling curve derivative comes from its
+    table, see `lfunc_derivative`.
+
+    Outputs
+    -------
+    jacobian : list
+        [[d(dqoverBds)/dqoverB, d(dqoverBds)/dT], [d(dtds)/dqoverB, d(dtds)/dT]]
+    """
+    qoverB, T = y
+    fieldValue = si.B.scalar(s)
+
+    radiation = (st.nu**2 * st.Tu**2) * st.cz / fieldValue
+    dLdT = lfunc_derivative(si.Lfunc, T)
+    ddqoverBdsdT = radiation * (dLdT / T**2 - 2 * si.Lfunc(T) / T**3)
+
+    conduction = fieldValue / (si.kappa0 * T ** (5 / 2))
+
+    return [[0.0, ddqoverBdsdT], [conduction, -5 / 2 * qoverB * conduction / T]]
+
+
+def control_parameters(si, cvar):
+    """
+    Impurity fraction, upstream density and radial heat source for a value
+    (or array of values) of the control variable.
+
+    Outputs
+    -------
+    cz, nu, qradial
+    """
+    cz, nu = si.cz0, si.nu0
+    qradial = (si.qpllu0 / si.geometry.Bx) / si.geometry.invB_integral
+
+    if si.control_variable == "impurity_frac":
+        cz = cvar
+    elif si.control_variable == "density":
+        nu = cvar
+    elif si.control_variable == "power":
+        # This is needed so that too high a cvar gives positive error
+        qradial = (1 / cvar / si.geometry.Bx) / si.geometry.invB_integral
+
+    return cz, nu, qradial
+
+
+def upstream_error(si, qpllu1):
+    """
+    error1 for an upstream heat flux qpllu1. If upstream grid, qpllu1 is at the
+    midplane and is solved until it's 0. It then gets radial transport so that
+    the xpoint Q is qpllu0. If upstreamGrid=False, qpllu1 is solved to match
+    qpllu0 at the Xpoint.
+    """
+    if si.radios["upstreamGrid"]:
+        return (qpllu1 - 0) / si.qpllu0
+    return (qpllu1 - si.qpllu0) / si.qpllu0
+
+
+def store_solution(si, st, qoverB, T, s_end=None):
+    """
+    Store a solution of the Lengyel function on st.s in the state, and work
+    out the upstream quantities and error1 from it.
+
+    If the heat flux ran out at s_end before reaching upstream, there is no
+    heat flux beyond that and so the temperature is flat. The upstream heat
+    flux is then taken as negative, in proportion to how much of the field
+    line was left, so the error is continuous with that of solutions which
+    just reach upstream.
+
+    Inputs
+    ------
+    qoverB : array
+        q/B on st.s, zero beyond s_end
+    T : array
+        Temperature on st.s, flat beyond s_end
+    s_end : float, optional
+        Where the heat flux ran out, if it did
+    """
+    st.q = qoverB * si.B(st.s)  # q profile
+    st.T = T  # Temp profile
+
+    st.Tucalc = st.T[-1]  # Upstream temperature. becomes st.Tu in outer loop
+
+    if s_end is None:
+        st.qpllu1 = st.q[-1]  # upstream q
+    else:
+        st.qpllu1 = -si.qpllu0 * (st.s[-1] - s_end) / (st.s[-1] - st.s[0])
+
+        if si.verbosity > 3:
+            print(f"Warning: heat flux ran out at s = {s_end:.3f}")
+
+    st.error1 = upstream_error(si, st.qpllu1)
+
+    if si.verbosity > 2:
+        print(
+            f" -> qpllu1: {st.qpllu1:.3E} | Tucalc: {st.Tucalc:.1f} | error1: {st.error1:.3E}"
+        )
+
+    st.update_log()
+
+    if st.Tucalc == 0:
+        raise RuntimeError("Tucalc is 0")
+
+
+def heat_flux_zero(s, y, si, st):  # noqa: ARG001 - events take LengFunc's arguments
+    """
+    Event for solve_ivp, ending the integration where q/B reaches zero.
+    Beyond this the heat flux would be negative, so the control variable is
+    too small and there is nothing to gain from integrating any further.
+    """
+    return y[0]
+
+
+heat_flux_zero.terminal = True
+heat_flux_zero.direction = -1
+
+
 def iterate(si, st):
     """
     Solves the Lengyel function for q and T profiles along field line.
     Calculates error1 by looking at upstream q and comparing it to 0
     (when upstreamGrid=True) or to qpllu0 (when upstreamGrid=False).
+    The integration stops early if q reaches zero. If the ODE solver fails,
+    the integration is retried with LSODA.
 
     Inputs
     ------
@@ -67,30 +191,13 @@ def iterate(si, st):
     st.Tucalc : float
         Upstream temperature for later use in outer loop to calculate error0
     st.qpllu1 : float
-        Upstream heat flux
+        Upstream heat flux. If the heat flux reaches zero before upstream,
+        this is -qpllu0 times the fraction of the field line left
     st.error1 : float
         Error in upstream heat flux
 
     """
-    if si.control_variable == "impurity_frac":
-        st.cz = st.cvar
-        st.nu = si.nu0
-
-    elif si.control_variable == "density":
-        st.cz = si.cz0
-        st.nu = st.cvar
-
-    st.qradial = (si.qpllu0 / si.Btot[si.Xpoint]) / trapezoid(
-        1 / si.Btot[si.Xpoint :], x=si.S[si.Xpoint :]
-    )
-
-    if si.control_variable == "power":
-        st.cz = si.cz0
-        st.nu = si.nu0
-        # This is needed so that too high a cvar gives positive error
-        st.qradial = (1 / st.cvar / si.Btot[si.Xpoint]) / trapezoid(
-            1 / si.Btot[si.Xpoint :], x=si.S[si.Xpoint :]
-        )
+    st.cz, st.nu, st.qradial = control_parameters(si, st.cvar)
 
     if si.verbosity > 2:
         print(
@@ -98,59 +205,476 @@ def iterate(si, st):
             end="",
         )
 
+    # If the solver fails, try again with the stiff LSODA before giving up
+    for method in dict.fromkeys([si.ode_method, "LSODA"]):
+        # The explicit RK45 doesn't use a Jacobian
+        jacobian = {} if method == "RK45" else {"jac": LengFuncJacobian}
+
+        result = solve_ivp(
+            LengFunc,
+            t_span=(st.s[0], st.s[-1]),
+            t_eval=st.s,
+            y0=[st.qpllt / si.B(st.s[0]), si.Tt],
+            method=method,
+            rtol=1e-5,
+            atol=1e-10,
+            events=heat_flux_zero,
+            args=(si, st),
+            **jacobian,
+        )
+        if result.status >= 0:
+            break
+
+        if si.verbosity > 3:
+            print(f"Warning: {method} failed at s = {result.t[-1]:.3f}")
+    else:
+        raise RuntimeError(f"Integrating the Lengyel function failed: {result.message}")
+
+    # Update state with results
+    qoverBresult = np.zeros(len(st.s))
+    Tresult = np.empty(len(st.s))
+    n = len(result.t)
+    qoverBresult[:n] = result.y[0]
+    Tresult[:n] = result.y[1]
+
+    s_end = None
+    if result.status == 1:
+        # The heat flux ran out before reaching upstream
+        s_end, T_end = result.t_events[0][0], result.y_events[0][0][1]
+        Tresult[n:] = T_end
+
+    store_solution(si, st, qoverBresult, Tresult, s_end)
+
+    return st
+
+
+# Dormand-Prince 5(4) tableau, as in scipy.integrate.RK45. These are tuples
+# of floats, which are quick to index in Python and constants to numba
+_DOPRI_C = (0.0, 1 / 5, 3 / 10, 4 / 5, 8 / 9, 1.0)
+_DOPRI_A = (
+    (0.0, 0.0, 0.0, 0.0, 0.0),
+    (1 / 5, 0.0, 0.0, 0.0, 0.0),
+    (3 / 40, 9 / 40, 0.0, 0.0, 0.0),
+    (44 / 45, -56 / 15, 32 / 9, 0.0, 0.0),
+    (19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729, 0.0),
+    (9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176, -5103 / 18656),
+)
+_DOPRI_B = (35 / 384, 0.0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84)
+_DOPRI_E = (
+    -71 / 57600,
+    0.0,
+    71 / 16695,
+    -71 / 1920,
+    17253 / 339200,
+    -22 / 525,
+    1 / 40,
+)
+
+
+def integrate_grid(fun, args, s, qoverB0, T0, qoverB, T, rtol=1e-5, atol=1e-10):
+    """
+    Integrate the Lengyel function over the nodes s with Dormand-Prince
+    5(4) steps, the scheme of RK45, but landing on every node rather than
+    interpolating onto them. The step size is still controlled by the
+    embedded error estimate, so intervals are only subdivided where
+    needed, e.g. at the steep temperature rise near the front.
+
+    The integration stops where q/B reaches zero, found by linear
+    interpolation within the step, and beyond that q/B is zero and T is
+    flat.
+
+    This is written so that numba can compile it as well, see
+    `numbaBackend`.
+
+    Inputs
+    ------
+    fun : callable
+        fun(s, qoverB, T, args) returning (dqoverBds, dtds) as floats
+    args : tuple
+        Passed on to fun
+    s : sequence
+        Nodes to integrate over
+    qoverB0, T0 : float
+        q/B and T at s[0]
+    qoverB, T : array
+        Arrays to write the solution on s into
+
+    Outputs
+    -------
+    status : int
+        0 if the integration reached the end of s, 1 if the heat flux ran
+        out, -1 if it failed (e.g. T went negative), in which case qoverB
+        and T are only filled up to s_end
+    s_end, T_end : float
+        Where the integration ended, and T there
+    """
+    n = len(s)
+    q, t = qoverB0, T0
+    qoverB[0], T[0] = q, t
+    kq = [0.0] * 7
+    kt = [0.0] * 7
+    kq[0], kt[0] = fun(s[0], q, t, args)
+    h = s[1] - s[0]
+
+    for j in range(n - 1):
+        x, x_next = s[j], s[j + 1]
+        while x < x_next:
+            step = min(h, x_next - x)
+
+            for stage in range(1, 6):
+                a = _DOPRI_A[stage]
+                zq, zt = q, t
+                for m in range(stage):
+                    zq += step * a[m] * kq[m]
+                    zt += step * a[m] * kt[m]
+                kq[stage], kt[stage] = fun(x + _DOPRI_C[stage] * step, zq, zt, args)
+
+            # The last stage is at the end of the step, and is the next
+            # step's first stage too
+            q_new, t_new = q, t
+            for m in range(6):
+                q_new += step * _DOPRI_B[m] * kq[m]
+                t_new += step * _DOPRI_B[m] * kt[m]
+            kq[6], kt[6] = fun(x + step, q_new, t_new, args)
+
+            error_q, error_t = 0.0, 0.0
+            for m in range(7):
+                error_q += step * _DOPRI_E[m] * kq[m]
+                error_t += step * _DOPRI_E[m] * kt[m]
+            error_q /= atol + rtol * max(abs(q), abs(q_new))
+            error_t /= atol + rtol * max(abs(t), abs(t_new))
+            error = math.sqrt((error_q**2 + error_t**2) / 2)
+
+            if not error <= 1:
+                # Reject the step, including if anything went NaN
+                h = step * (max(0.2, 0.9 * error**-0.2) if error > 1 else 0.2)
+                if h < 1e-12 * max(abs(x), 1.0):
+                    return -1, x, t
+                continue
+
+            if q_new <= 0:
+                # The heat flux ran out within this step
+                frac = q / (q - q_new)
+                T_end = t + frac * (t_new - t)
+                qoverB[j + 1 :] = 0.0
+                T[j + 1 :] = T_end
+                return 1, x + frac * step, T_end
+
+            x += step
+            q, t = q_new, t_new
+            kq[0], kt[0] = kq[6], kt[6]
+            if step == h:
+                # Only grow steps which weren't cut short by the next node
+                h = step * (10.0 if error == 0 else min(10.0, 0.9 * error**-0.2))
+
+        qoverB[j + 1], T[j + 1] = q, t
+
+    return 0, s[n - 1], t
+
+
+def _lengfunc_grid(s, qoverB, T, args):
+    """LengFunc for integrate_grid, with the constant factors taken out"""
+    radiation, qradial, kappa0, Sx, B, Lfunc = args
+    if not T > 0:
+        return math.nan, math.nan
+    fieldValue = B(s)
+    dqoverBds = radiation / T**2 * Lfunc(T) / fieldValue
+    if s > Sx:
+        dqoverBds -= qradial / fieldValue
+    return dqoverBds, qoverB * fieldValue / (kappa0 * T**2.5)
+
+
+def iterate_grid(si, st):
+    """
+    As iterate(), but integrating with integrate_grid() rather than
+    solve_ivp. Falls back to iterate() if integrate_grid() fails.
+    """
+    st.cz, st.nu, st.qradial = control_parameters(si, st.cvar)
+
+    B = si.B.scalar
+    args = (
+        st.nu**2 * st.Tu**2 * st.cz,
+        st.qradial,
+        si.kappa0,
+        si.geometry.Sx if si.radios["upstreamGrid"] else math.inf,
+        B,
+        si.Lfunc,
+    )
+
+    # Python floats are quicker to index and do arithmetic with than numpy's
+    s = st.s.tolist()
+    # Fresh arrays for each iterate, as st.T is kept by the iterate cache and
+    # as the previous front, so reusing one between iterates would overwrite
+    # those. Allocating them takes microseconds, next to milliseconds for
+    # the integration
+    qoverB = np.empty(len(s))
+    T = np.empty(len(s))
+    status, s_end, _ = integrate_grid(
+        _lengfunc_grid, args, s, st.qpllt / B(s[0]), float(si.Tt), qoverB, T
+    )
+
+    if status < 0:
+        return iterate(si, st)
+
+    store_solution(si, st, qoverB, T, s_end if status == 1 else None)
+
+    return st
+
+
+def LengFuncTemperature(T, y, si, st):
+    """
+    The Lengyel function with T as the independent variable, for
+    iterate_temperature().
+
+    The state is s and u = (q/B)**2 / 2. Written in terms of u, the
+    radiation term is the integrand of the cooling curve integral
+    kappa0 * sqrt(T) * L(T), over B**2, and the 1/q that dq/dT would
+    otherwise have goes away. Only ds/dT = 1/(dT/ds) is singular, where
+    the heat flux runs out.
+
+    Outputs
+    -------
+    [dsdT, dudT] : list
+    """
+    s, u = y
+    if u == 0 or not math.isfinite(s):
+        return [math.nan, math.nan]
+    fieldValue = si.B.scalar(s)
+    conduction = si.kappa0 * T ** (5 / 2) / fieldValue**2
+
+    dudT = (st.nu**2 * st.Tu**2) * st.cz * si.Lfunc(T) / T**2 * conduction
+    if si.radios["upstreamGrid"] and s > si.geometry.Sx:
+        dudT -= st.qradial * conduction
+
+    # Continued past where the heat flux runs out, so that u crosses zero
+    # smoothly for the event to find
+    return [conduction * fieldValue / math.sqrt(2 * abs(u)), dudT]
+
+
+# Takes the same arguments as LengFuncTemperature, as solve_ivp events must
+def _upstream_reached(T, y, si, st):  # noqa: ARG001
+    """Event for iterate_temperature(), at the upstream end of st.s"""
+    return y[0] - st.s[-1]
+
+
+_upstream_reached.terminal = True
+_upstream_reached.direction = 1
+
+
+# Takes the same arguments as LengFuncTemperature, as solve_ivp events must
+def _heat_flux_low(T, y, si, st):  # noqa: ARG001
+    """
+    Event for iterate_temperature(), where q/B falls to a small fraction of
+    the upstream q/B. T has a maximum where q reaches zero, so it stops
+    being a good independent variable near there.
+    """
+    return y[1] - (_SWITCH_FRACTION * si.qpllu0 / si.geometry.Bx) ** 2 / 2
+
+
+_heat_flux_low.terminal = True
+_heat_flux_low.direction = -1
+
+# Fraction of the upstream q/B at which iterate_temperature() switches back
+# to integrating in s
+_SWITCH_FRACTION = 0.05
+
+
+def iterate_temperature(si, st, Tmax=1e4, samples=4):
+    """
+    As iterate(), but integrating LengFuncTemperature() in T from the
+    target. This continues until reaching upstream or until the heat flux
+    has nearly run out, in which case the rest is integrated in s as in
+    iterate(). The temperature and heat flux from the T integration are
+    interpolated onto st.s with monotone cubics, through `samples` points
+    of the dense output per step.
+
+    Inputs
+    ------
+    Tmax : float
+        Temperature to give up at [eV], if neither end is reached
+    """
+    st.cz, st.nu, st.qradial = control_parameters(si, st.cvar)
+
+    qoverB0 = st.qpllt / si.B(st.s[0])
     result = solve_ivp(
-        LengFunc,
-        t_span=(st.s[0], st.s[-1]),
-        t_eval=st.s,
-        y0=[st.qpllt / si.B(st.s[0]), si.Tt],
+        LengFuncTemperature,
+        t_span=(si.Tt, Tmax),
+        y0=[st.s[0], qoverB0**2 / 2],
         rtol=1e-5,
         atol=1e-10,
+        events=[_upstream_reached, _heat_flux_low],
+        dense_output=True,
         args=(si, st),
     )
+    reached_upstream = len(result.t_events[0]) > 0
 
-    # Update state with results
-    qoverBresult = result.y[0]
-    Tresult = result.y[1]
+    # Dense output between the steps, which s(T) is monotone over
+    steps = result.t
+    fractions = np.arange(samples) / samples
+    Tsample = np.append(
+        (steps[:-1, None] + np.diff(steps)[:, None] * fractions), steps[-1]
+    )
+    ssample, usample = result.sol(Tsample)
+    if reached_upstream:
+        # Rather than a root finding tolerance short of it
+        ssample[-1] = st.s[-1]
+    ssample = np.maximum.accumulate(ssample)
+    unique = np.append(np.diff(ssample) > 0, True)
+    Tsample, ssample, usample = Tsample[unique], ssample[unique], usample[unique]
 
-    # Sometimes when solve_ivp returns negative q upstream, it will trim
-    # the output instead of giving nans. This pads it back to correct length
-    if len(qoverBresult) < len(st.s):
-        if si.verbosity > 3:
-            print("Warning: solver output contains NaNs")
+    s_switch = ssample[-1]
+    inside = st.s <= s_switch
+    qoverBresult = np.zeros(len(st.s))
+    Tresult = np.full(len(st.s), Tsample[-1])
+    if len(ssample) > 1:
+        Tresult[inside] = interpolate.pchip_interpolate(ssample, Tsample, st.s[inside])
+        qoverBresult[inside] = interpolate.pchip_interpolate(
+            ssample, np.sqrt(2 * np.maximum(usample, 0)), st.s[inside]
+        )
 
-        qoverBresult = np.insert(
-            qoverBresult, -1, np.zeros(len(st.s) - len(qoverBresult))
+    s_end = None if reached_upstream else s_switch
+    beyond = np.flatnonzero(~inside)
+    if not reached_upstream and result.status == 1 and len(beyond):
+        # Finish off in s, as in iterate()
+        rest = solve_ivp(
+            LengFunc,
+            t_span=(s_switch, st.s[-1]),
+            t_eval=st.s[beyond],
+            y0=[math.sqrt(2 * usample[-1]), Tsample[-1]],
+            rtol=1e-5,
+            atol=1e-10,
+            events=heat_flux_zero,
+            args=(si, st),
         )
-        Tresult = np.insert(Tresult, -1, np.zeros(len(st.s) - len(qoverBresult)))
+        n = len(rest.t)
+        if n:
+            qoverBresult[beyond[:n]] = rest.y[0]
+            Tresult[beyond[:n]] = rest.y[1]
+        if rest.status == 0:
+            s_end = None
+        elif rest.status == 1:
+            s_end, Tresult[beyond[n:]] = rest.t_events[0][0], rest.y_events[0][0][1]
+        elif n:
+            s_end, Tresult[beyond[n:]] = rest.t[-1], rest.y[1][-1]
 
-    st.q = qoverBresult * si.B(st.s)  # q profile
-    st.T = Tresult  # Temp profile
+    store_solution(si, st, qoverBresult, Tresult, s_end)
 
-    st.Tucalc = st.T[-1]  # Upstream temperature. becomes st.Tu in outer loop
+    return st
 
-    # Set qpllu1 to lowest q value in array.
-    # Prevents unphysical results when ODEINT bugs causing negative q in middle but still positive q at end, fooling solver to go in wrong direction
-    # Sometimes this also creates a single NaN which breaks np.min(), hence nanmin()
-    if len(st.q[st.q < 0]) > 0:
-        st.qpllu1 = np.nanmin(st.q)  # minimum q
-    else:
-        st.qpllu1 = st.q[-1]  # upstream q
 
-    # If upstream grid, qpllu1 is at the midplane and is solved until it's 0. It then gets radial transport
-    # so that the xpoint Q is qpllu0. If uypstramGrid=False, qpllu1 is solved to match qpllu0 at the Xpoint.
-    if si.radios["upstreamGrid"]:
-        st.error1 = (st.qpllu1 - 0) / si.qpllu0
-    else:
-        st.error1 = (st.qpllu1 - si.qpllu0) / si.qpllu0
+def LengFuncBatch(s, y, si, radiation, qradial):
+    """
+    LengFunc for K independent values of the control variable at once.
 
-    if si.verbosity > 2:
-        print(
-            f" -> qpllu1: {st.qpllu1:.3E} | Tucalc: {st.Tucalc:.1f} | error1: {st.error1:.3E}"
-        )
+    Inputs
+    -------
+    y : array
+        q/B of each candidate followed by T of each candidate, length 2K
+    s : float
+        Parallel coordinate of front position
+    si : SimulationInput
+        Simulation input object containing all constant parameters
+    radiation : list
+        nu**2 * Tu**2 * cz of each candidate
+    qradial : list
+        Radial heat source of each candidate
 
-    st.update_log()
+    Outputs
+    -------
+    dqoverBds + dtds : list
+        Concatenated gradients
+    """
+    K = len(radiation)
+    qoverB, T = y[:K].tolist(), y[K:].tolist()
+    fieldValue = si.B.scalar(s)
+    Lfunc = si.Lfunc
 
-    if st.Tucalc == 0:
-        raise Exception("Tucalc is 0")
+    # Candidates are looped over in Python: for the handful of them this is
+    # used with, NumPy's overhead on tiny arrays costs more than the loop
+    dqoverBds = [r / Tk**2 * Lfunc(Tk) / fieldValue for r, Tk in zip(radiation, T)]
+    if si.radios["upstreamGrid"] and s > si.geometry.Sx:
+        dqoverBds = [dq - qr / fieldValue for dq, qr in zip(dqoverBds, qradial)]
 
-    return st
+    # Once a candidate's heat flux runs out its temperature stays flat, which
+    # keeps it from going negative without a kink in q that would stall the
+    # step size control for the others
+    dtds = [
+        max(q, 0) * fieldValue / (si.kappa0 * Tk ** (5 / 2)) if Tk > 0 else math.nan
+        for q, Tk in zip(qoverB, T)
+    ]
+
+    return dqoverBds + dtds
+
+
+class _CandidateHeatFluxZero:
+    """heat_flux_zero for one candidate of LengFuncBatch"""
+
+    terminal = False
+    direction = -1
+
+    def __init__(self, k):
+        self.k = k
+
+    # Takes the same arguments as LengFuncBatch, as solve_ivp events must
+    def __call__(self, s, y, *args):  # noqa: ARG002
+        return y[self.k]
+
+
+def iterate_batch(si, st, cvar):
+    """
+    Solves the Lengyel function for several values of the control variable in
+    one integration, as a single system of 2K equations. The rest of the state
+    (Tu, qpllt, s) is shared.
+
+    This is for bracketing the control variable, so only the upstream
+    quantities are returned and st is left unchanged.
+
+    Inputs
+    ------
+    si : SimulationInput
+        Simulation input object containing all constant parameters
+    st : SimulationState
+        Simulation state object containing all evolved parameters
+    cvar : array
+        K values of the control variable
+
+    Outputs
+    -------
+    error1 : array
+        Error in upstream heat flux of each candidate, as from iterate()
+    qpllu1 : array
+        Upstream heat flux of each candidate
+    Tucalc : array
+        Upstream temperature of each candidate
+    """
+    cvar = np.asarray(cvar, dtype=float)
+    K = len(cvar)
+    cz, nu, qradial = control_parameters(si, cvar)
+    radiation = np.broadcast_to(nu**2 * st.Tu**2 * cz, (K,)).tolist()
+    qradial = np.broadcast_to(qradial, (K,)).tolist()
+
+    y0 = np.concatenate([np.full(K, st.qpllt / si.B(st.s[0])), np.full(K, si.Tt)])
+    result = solve_ivp(
+        LengFuncBatch,
+        t_span=(st.s[0], st.s[-1]),
+        y0=y0,
+        rtol=1e-5,
+        atol=1e-10,
+        events=[_CandidateHeatFluxZero(k) for k in range(K)],
+        args=(si, radiation, qradial),
+    )
+
+    qoverB, Tucalc = result.y[:, -1].reshape(2, -1)
+    qpllu1 = qoverB * si.B(st.s[-1])
+    for k in range(K):
+        # Heat flux ran out, or the solver failed before reaching upstream
+        if len(result.t_events[k]):
+            s_end = result.t_events[k][0]
+            Tucalc[k] = result.y_events[k][0][K + k]
+        elif result.status != 0:
+            s_end = result.t[-1]
+        else:
+            continue
+        qpllu1[k] = -si.qpllu0 * (st.s[-1] - s_end) / (st.s[-1] - st.s[0])
+
+    return upstream_error(si, qpllu1), qpllu1, Tucalc
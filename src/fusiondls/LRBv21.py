@@ -1,13 +1,35 @@
+import inspect
+import multiprocessing
+import os
+import pickle
 from collections import defaultdict
+from concurrent.futures import Executor, ProcessPoolExecutor
 from timeit import default_timer as timer
+from typing import Optional, Union
 
 import numpy as np
 from scipy import interpolate
-from scipy.integrate import cumulative_trapezoid, trapezoid
-
+from scipy.integrate import solve_bvp, trapezoid
+
+from . import numbaBackend
+from .Analytic_DLS import CfInt_array
+from .AnalyticCoolingCurves import evaluate_Lfunc
+from .CoolingCurveTable import (
+    CoolingCurveTable,
+    cooling_curve_integral,
+    cooling_curve_table,
+)
 from .DLScommonTools import pad_profile
-from .Iterate import iterate
+from .FieldInterpolator import FieldInterpolator
+from .Iterate import (
+    control_parameters,
+    iterate,
+    iterate_batch,
+    iterate_grid,
+    iterate_temperature,
+)
 from .refineGrid import refineGrid
+from .rootFinding import ITP, ROOT_FINDERS
 from .typing import FloatArray
 
 
@@ -47,6 +69,12 @@ class SimulationState:
         qpllu1 converted into a source term representing radial heat flux between upstream and X-point
     qpllt : float
         Virtual target heat flux (typically 0)
+    previous_front : tuple
+        s, q/B, T, cvar and Tu at the last solved front position, for
+        solve_mode="bvp"
+    cache : dict
+        Results of iterate by cvar, Tu and qpllt at the grid point
+        cache_point, see `_iterate_cached`
     """
 
     def __init__(self, si):
@@ -58,35 +86,33 @@ class SimulationState:
         self.qpllu1 = 0
         self.lower_bound = 0
         self.upper_bound = 0
+        self.previous_front = None
+        self.cache = {}
+        self.cache_point = None
 
         # Initialise log: one per front position index
-        self.singleLog = {}
-
-        logParams = [
-            "error0",
-            "error1",
-            "cvar",
-            "qpllu1",
-            "Tu",
-            "lower_bound",
-            "upper_bound",
-        ]
-        for x in logParams:
-            self.singleLog[x] = []
+        self.new_log()
 
         self.log = {}  # Log for all front positions
 
+    logParams = (
+        "error0",
+        "error1",
+        "cvar",
+        "qpllu1",
+        "Tu",
+        "qpllt",
+        "lower_bound",
+        "upper_bound",
+    )
+
+    ## Start a fresh log for a new front position
+    def new_log(self):
+        self.singleLog = {param: [] for param in self.logParams}
+
     ## Update primary log
     def update_log(self):
-        for param in [
-            "error0",
-            "error1",
-            "cvar",
-            "qpllu1",
-            "Tu",
-            "lower_bound",
-            "upper_bound",
-        ]:
+        for param in self.logParams:
             self.singleLog[param].append(self.get(param))
 
         self.log[self.SparFront] = self.singleLog  # Put in global log
@@ -120,6 +146,52 @@ class SimulationState:
         return self.__dict__[param]
 
 
+class GeometryContext:
+    """
+    Invariants of a field line grid which are needed on every call to iterate().
+    These only change when the grid does, so are computed once per grid and kept
+    on SimulationInputs as si.geometry.
+
+    Parameters
+    ----------
+    S : array
+        Parallel distance [m]
+    Btot : array
+        Total B field [T]
+    Xpoint : int
+        Index of X-point in parallel space
+    B : FieldInterpolator
+        Interpolator function returning a Btot for a given S
+    invBtot : array
+        1 / Btot [T^-1]
+    Bx : float
+        Total B field at the X-point [T]
+    Sx : float
+        Parallel distance of the X-point [m]
+    invB_integral : float
+        Integral of 1/Btot over S from the X-point upstream, used to normalise
+        the radial heat source qradial [m/T]
+    """
+
+    def __init__(self, S, Btot, Xpoint):
+        self.S = S
+        self.Btot = Btot
+        self.Xpoint = Xpoint
+        self.B = FieldInterpolator(S, Btot)
+        self.invBtot = 1 / np.asarray(Btot)
+        self.Bx = Btot[Xpoint]
+        self.Sx = S[Xpoint]
+        self.invB_integral = trapezoid(self.invBtot[Xpoint:], x=S[Xpoint:])
+
+    def matches(self, S, Btot, Xpoint):
+        """True if this context was built for the given grid"""
+        return (
+            Xpoint == self.Xpoint
+            and np.array_equal(S, self.S)
+            and np.array_equal(Btot, self.Btot)
+        )
+
+
 class SimulationInputs:
     """
     This class functions the same as SimulationState, but is used to store the inputs instead.
@@ -171,10 +243,18 @@ class SimulationInputs:
         Parallel distance [m]
     Spol : array
         Poloidal distance [m]
-    B : interp1d function
+    B : FieldInterpolator
         Interpolator function returning a Btot for a given S
     Btot : array
         Total B field [T]
+    Bpol : array
+        Poloidal B field [T]
+    geometry : GeometryContext
+        Precomputed invariants of the current grid
+    iterate : callable
+        Integrator for single iterates, `Iterate.iterate` or the numba kernel
+    ode_method : str, default RK45
+        solve_ivp method used by `Iterate.iterate`
     """
 
     def __init__(self):
@@ -182,6 +262,21 @@ class SimulationInputs:
         self.kappa0 = 2500
         self.mi = 3 * 10 ** (-27)
         self.echarge = 1.60 * 10 ** (-19)
+        self.geometry = None
+        self.ode_method = "RK45"
+
+    def set_geometry(self, S, Spol, Btot, Bpol, Xpoint):
+        """Set the field line grid, rebuilding the geometry context only if the
+        grid has changed"""
+        if self.geometry is None or not self.geometry.matches(S, Btot, Xpoint):
+            self.geometry = GeometryContext(S, Btot, Xpoint)
+
+        self.S = S
+        self.Spol = Spol
+        self.Btot = Btot
+        self.Bpol = Bpol
+        self.Xpoint = Xpoint
+        self.B = self.geometry.B
 
     # Update many variables
     def update(self, **kwargs):
@@ -192,12 +287,24 @@ class SimulationInputs:
         return str(self.__dict__)
 
 
+# Integrators for single iterates, see run_dls
+BACKENDS = {
+    "scipy": iterate,
+    "grid": iterate_grid,
+    "numba": numbaBackend.iterate,
+    "temperature": iterate_temperature,
+}
+
+# solve_ivp methods for the "scipy" backend
+ODE_METHODS = ["RK45", "Radau", "BDF", "LSODA"]
+
+
 def run_dls(
     constants: dict,
     radios: dict,
     d: dict,
     SparRange: FloatArray,
-    control_variable: str = "impurity_frac",
+    control_variable: Union[str, list[str]] = "impurity_frac",
     verbosity: int = 0,
     Ctol: float = 1e-3,
     Ttol: float = 1e-2,
@@ -208,6 +315,16 @@ def run_dls(
     dynamicGridRefinementWidth: float = 1,
     dynamicGridDiagnosticPlot: bool = False,
     zero_qpllt: bool = False,
+    warm_start: bool = False,
+    root_method: str = "bisect",
+    solve_mode: str = "nested",
+    bracket_batch: int = 1,
+    n_workers: Optional[int] = None,
+    executor: Optional[Executor] = None,
+    backend: str = "scipy",
+    ode_method: str = "RK45",
+    analytic_start: bool = False,
+    outputs: str = "full",
 ) -> dict[str, FloatArray]:
     """Run the DLS-extended model
 
@@ -224,7 +341,12 @@ def run_dls(
     indexRange:
         array of S indices of the parallel front locations to solve for
     control_variable:
-        either impurity_frac, density or power
+        either impurity_frac, density or power. A list of impurity_frac
+        and density solves once for the radiation parameter nu**2 * cz,
+        which is all the Lengyel function depends on, and returns a dict
+        of outputs for each control variable. Their "qpllt_mismatch" is
+        the relative difference between nu0, which sets the target heat
+        flux, and the solved upstream density, see `_derived_output`
     Ctol:
         error tolerance target for the inner loop (i.e. density/impurity/heat flux)
     Ttol:
@@ -239,279 +361,1034 @@ def run_dls(
         ratio of finest to coarsest cell width in dynamic grid
     dynamicGridRefinementWidth:
         size of dynamic grid refinement region in metres parallel
+    warm_start:
+        start each front position from cvar and Tu extrapolated from the
+        previous solved front positions, bracketing cvar with small steps
+        before falling back to doubling/halving. Recommended for dense scans
+    root_method:
+        root finder for the control variable (inner) loop, one of "bisect",
+        "brent" or "itp". The latter two usually need far fewer iterations
+    solve_mode:
+        "nested" solves for cvar in an inner loop inside a fixed point
+        iteration on Tu. "broyden" solves for both together with Broyden's
+        method, falling back to "nested" if that doesn't converge. "bvp"
+        solves for the profiles, cvar and Tu at once with
+        `scipy.integrate.solve_bvp`, starting from the solution at the
+        previous front position (the first front is solved as "nested"),
+        and falls back to "nested" in the same way
+    bracket_batch:
+        number of steps of the cvar bracketing to integrate at once, as a
+        single ODE system. Each step is otherwise a separate integration
+    n_workers:
+        solve the front positions in this many processes, each solving a
+        contiguous block of SparRange in turn. The first front of each
+        block starts without a previous front, so with ``warm_start``,
+        ``analytic_start`` or solve_mode="bvp" the output matches solving
+        them all in turn to within the tolerances rather than exactly
+    executor:
+        `concurrent.futures.Executor` to solve the front positions with
+        instead of a new process pool. Unless it runs in this process,
+        everything in ``constants`` must then be picklable, so ``Lfunc``
+        should be e.g. a module level function or a CubicSpline
+    backend:
+        "scipy" integrates each iterate with `scipy.integrate.solve_ivp`.
+        "grid" uses the same RK45 scheme, but steps exactly onto the grid
+        nodes rather than interpolating, which has less overhead.
+        "numba" uses a compiled version of "grid" in `numbaBackend`,
+        falling back to "scipy" if numba isn't installed. "temperature"
+        integrates with T rather than s as the independent variable,
+        which is more accurate for the same tolerance but takes a few more
+        steps. Only the iterates of single fronts use these, not
+        ``bracket_batch``
+    ode_method:
+        `scipy.integrate.solve_ivp` method for the "scipy" backend, one of
+        "RK45", "Radau", "BDF" or "LSODA". The implicit methods use the
+        analytic Jacobian `Iterate.LengFuncJacobian`
+    analytic_start:
+        start each front position after the first from the analytic
+        control parameter `Analytic_DLS.CfInt_array`, scaled to the solution at
+        the first front, bracketing cvar with small steps. Fronts which are
+        warm started use the extrapolation instead. With ``n_workers``,
+        each block is scaled to its own first front
+    outputs:
+        "full" returns the profiles and logs at every front position, as
+        well as the scan results. "scalars" returns only the threshold,
+        window, window_frac and window_ratio. These only depend on the
+        first and last front positions, so only those are solved, and
+        their logs aren't kept. Pass ``n_workers=2`` to solve the two at
+        once
 
     """
+    if outputs not in {"full", "scalars"}:
+        raise ValueError(f"Unknown outputs '{outputs}', expected 'full' or 'scalars'")
+
+    if outputs == "scalars":
+        SparRange = [SparRange[0], SparRange[-1]] if len(SparRange) > 1 else SparRange
+
+    if not isinstance(control_variable, str):
+        arguments = {
+            "constants": constants,
+            "radios": radios,
+            "d": d,
+            "SparRange": SparRange,
+            "control_variable": "impurity_frac",
+            "verbosity": verbosity,
+            "Ctol": Ctol,
+            "Ttol": Ttol,
+            "URF": URF,
+            "timeout": timeout,
+            "dynamicGrid": dynamicGrid,
+            "dynamicGridRefinementRatio": dynamicGridRefinementRatio,
+            "dynamicGridRefinementWidth": dynamicGridRefinementWidth,
+            "dynamicGridDiagnosticPlot": dynamicGridDiagnosticPlot,
+            "zero_qpllt": zero_qpllt,
+            "warm_start": warm_start,
+            "root_method": root_method,
+            "solve_mode": solve_mode,
+            "bracket_batch": bracket_batch,
+            "n_workers": n_workers,
+            "executor": executor,
+            "backend": backend,
+            "ode_method": ode_method,
+            "analytic_start": analytic_start,
+            "outputs": "full",
+        }
+        results = _run_combined(arguments, control_variable)
+        if outputs == "scalars":
+            return {cv: _scalar_results(result) for cv, result in results.items()}
+        return results
+
+    backend = _check_options(root_method, solve_mode, backend, ode_method)
+
     # Start timer
     t0 = timer()
 
-    # Initialise simulation inputs object
-    si = SimulationInputs()
+    print("Solving...", end="")
 
-    # Add inputs to SimulationInputs
-    si.update(**constants)
-    si.verbosity = verbosity
-    si.Ctol = Ctol
-    si.Ttol = Ttol
-    si.URF = URF
-    si.timeout = timeout
-    si.radios = radios
-    si.control_variable = control_variable
+    options = {
+        "control_variable": control_variable,
+        "verbosity": verbosity,
+        "Ctol": Ctol,
+        "Ttol": Ttol,
+        "URF": URF,
+        "timeout": timeout,
+        "dynamicGrid": dynamicGrid,
+        "dynamicGridRefinementRatio": dynamicGridRefinementRatio,
+        "dynamicGridRefinementWidth": dynamicGridRefinementWidth,
+        "dynamicGridDiagnosticPlot": dynamicGridDiagnosticPlot,
+        "zero_qpllt": zero_qpllt,
+        "warm_start": warm_start,
+        "root_method": root_method,
+        "solve_mode": solve_mode,
+        "bracket_batch": bracket_batch,
+        "backend": backend,
+        "ode_method": ode_method,
+        "analytic_start": analytic_start,
+        "outputs": outputs,
+    }
+
+    if executor is None and (n_workers or 1) == 1:
+        output, st, complete = _solve_fronts(constants, radios, d, SparRange, **options)
+    else:
+        output, st, complete = _solve_fronts_parallel(
+            constants, radios, d, SparRange, options, n_workers, executor
+        )
 
-    # Extract topology data
-    si.Xpoint = d["Xpoint"]
-    si.S = d["S"]
-    si.Spol = d["Spol"]
-    si.Btot = d["Btot"]
-    si.Bpol = d["Bpol"]
-    si.B = interpolate.interp1d(si.S, si.Btot, kind="cubic")
-    si.SparRange = SparRange
-    # si.indexRange = [np.argmin(abs(d["S"] - x)) for x in SparRange] # Indices of topology arrays to solve code at
-    # si.indexRange = np.unique(si.indexRange)   # Drop duplicates
+    if not complete:
+        return output
 
-    # Initialise simulation state object
-    st = SimulationState(si)
+    """------COLLECT RESULTS------"""
+    output = _finish_output(output, st, constants, radios)
+    t1 = timer()
+
+    print(f"Complete in {t1 - t0:.1f} seconds")
+
+    if outputs == "scalars":
+        return _scalar_results(output)
+    return output
+
+
+def run_dls_adaptive(
+    constants: dict,
+    radios: dict,
+    d: dict,
+    tol: float = 1e-2,
+    n_initial: int = 7,
+    max_fronts: int = 50,
+    SparMax: Optional[float] = None,
+    **kwargs,
+) -> dict[str, FloatArray]:
+    """Run `run_dls` at front positions chosen to resolve the crel curve
+
+    Starts from ``n_initial`` evenly spaced front positions between the
+    target and ``SparMax``. Then, in rounds, adds a front position in the
+    middle of each interval where the error of interpolating crel linearly
+    is estimated to be more than ``tol``, worst first, until there are
+    none left or there are ``max_fronts``. Intervals with no grid point
+    inside aren't split.
+
+    The error at the middle of each interval is estimated by comparing
+    with the cubic through the nearest four front positions.
+
+    Parameters
+    ----------
+    tol:
+        Target relative interpolation error of crel. This can't usefully be
+        much smaller than the noise in crel from ``Ttol``
+    n_initial:
+        Number of front positions to start with
+    max_fronts:
+        Maximum total number of front positions
+    SparMax:
+        Last front position. Defaults to just below the X-point
+    kwargs:
+        Passed on to `run_dls`, apart from ``SparRange`` and ``outputs``.
+        ``control_variable`` has to be a single control variable
+
+    Returns
+    -------
+    output : dict
+        As for `run_dls`, with the front positions in order
+    """
+    # The refinement needs the full output of a single control variable
+    invalid = {"SparRange", "outputs"} & set(kwargs)
+    if not isinstance(kwargs.get("control_variable", ""), str):
+        invalid.add("control_variable")
+    if invalid:
+        raise ValueError(
+            f"Can't pass {sorted(invalid)} to run_dls_adaptive, which chooses "
+            "SparRange itself and solves for a single control_variable"
+        )
+
+    if SparMax is None:
+        SparMax = d["S"][d["Xpoint"] - 1]
+
+    fronts = {}
+    logs = {}
+    new = np.linspace(0, SparMax, n_initial)
+    while len(new):
+        result = run_dls(constants, radios, d, new, **kwargs)
+        if "state" not in result:
+            # Failed to converge, so there are only the logs
+            return result
+
+        logs.update(result["logs"])
+        for i, SparFront in enumerate(new):
+            fronts[SparFront] = {
+                key: result[key][i] for key in _FRONT_KEYS if key in result
+            }
+
+        SparRange = np.array(sorted(fronts))
+        # Where the fronts were actually solved, on the grid
+        Splot, cvar = np.array(
+            [
+                [fronts[SparFront][key] for key in ("Splot", "cvar")]
+                for SparFront in SparRange
+            ]
+        ).T
+        new = _refine_fronts(d["S"], Splot, cvar / cvar[0], tol)
+        new = new[: max_fronts - len(SparRange)]
 
-    # Initialise output dictionary
     output = defaultdict(list)
+    for SparFront in SparRange:
+        for key, value in fronts[SparFront].items():
+            output[key].append(value)
+    output["logs"] = {SparFront: logs[SparFront] for SparFront in SparRange}
+
+    return _finish_output(output, result["state"], constants, radios)
+
+
+def _refine_fronts(S, SparRange, crel, tol):
+    """Midpoints of the intervals of SparRange where the estimated relative
+    error of interpolating crel linearly is more than tol, worst first"""
+    midpoints = (SparRange[:-1] + SparRange[1:]) / 2
+    linear = (crel[:-1] + crel[1:]) / 2
+
+    # Compare with the cubic through the nearest four front positions
+    error = np.zeros(len(midpoints))
+    n = min(len(SparRange), 4)
+    for i, midpoint in enumerate(midpoints):
+        start = min(max(i - 1, 0), len(SparRange) - n)
+        stencil = slice(start, start + n)
+        cubic = np.polyfit(SparRange[stencil] - midpoint, crel[stencil], n - 1)[-1]
+        error[i] = abs(cubic / linear[i] - 1)
+
+    # Fronts are solved at the nearest grid point, so there is nothing to
+    # gain from a midpoint which is nearest to the same one as an end
+    point = np.abs(S[:, None] - SparRange).argmin(axis=0)
+    mid_point = np.abs(S[:, None] - midpoints).argmin(axis=0)
+    inside = (mid_point != point[:-1]) & (mid_point != point[1:])
+
+    split = np.flatnonzero((error > tol) & inside)
+    return midpoints[split[np.argsort(-error[split])]]
+
+
+# Keyword arguments of run_dls which find_onset and solve_front_position
+# pass on
+_SINGLE_FRONT_KWARGS = (
+    "verbosity",
+    "Ctol",
+    "Ttol",
+    "URF",
+    "timeout",
+    "zero_qpllt",
+    "root_method",
+    "solve_mode",
+    "bracket_batch",
+    "backend",
+    "ode_method",
+)
+
+
+def find_onset(
+    constants: dict,
+    radios: dict,
+    d: dict,
+    crel: float = 1,
+    SparMax: Optional[float] = None,
+    xtol: float = 0,
+    n_seed: int = 5,
+    control_variable: str = "impurity_frac",
+    **kwargs,
+) -> dict:
+    """Find the front position where crel crosses a target value, without
+    a scan
+
+    By default this is the detachment onset, the front position where crel
+    comes back up to 1 after an unstable region (where it is below 1), or
+    for power, back down to 1.
+    `run_dls` interpolates ``spar_onset`` and ``spol_onset`` from a scan
+    instead, which has to be dense to be accurate.
+
+    The crossing is first bracketed by solving at ``n_seed`` evenly spaced
+    front positions, the first of which is the target. The bracket is
+    around the first crossing upwards after the lowest crel among these
+    (for power, downwards after the highest), which keeps noise in crel
+    near the target (from ``Ttol``) from being mistaken for the onset. The crossing is then found with
+    `rootFinding.ITP` in the front position, rounded to grid points,
+    warm starting each front from the ends of the bracket around it. This
+    takes around log2 of the number of grid points in the bracket more
+    solves. Finally, the crossing is interpolated linearly between the
+    ends of the bracket, as in `run_dls`.
 
-    # Initialise cooling curve
-    # TODO: move into SimulationInputs once interface is refactored
-    Tcool = np.linspace(0.3, 500, 1000)
-    Lalpha = []
-    for dT in Tcool:
-        Lalpha.append(si.Lfunc(dT))
-    Lalpha = np.array(Lalpha)
-    Tcool = np.append(0, Tcool)
-    Lalpha = np.append(0, Lalpha)
-    si.Lz = [Tcool, Lalpha]  # Array of temperatures and corresponding cooling
+    Parameters
+    ----------
+    crel:
+        Value of cvar relative to that at the target to find
+    SparMax:
+        Last front position. Defaults to just below the X-point
+    xtol:
+        Stop when the bracket is narrower than this, in metres parallel.
+        By default, stops when its ends are neighbouring grid points
+    n_seed:
+        Number of front positions to bracket the crossing with
+    control_variable:
+        As for `run_dls`
+    kwargs:
+        Passed on to `run_dls`, which takes the ``verbosity``, ``Ctol``,
+        ``Ttol``, ``URF``, ``timeout``, ``zero_qpllt``, ``root_method``,
+        ``solve_mode``, ``bracket_batch``, ``backend`` and ``ode_method``
+
+    Returns
+    -------
+    output : dict
+        "spar_onset" and "spol_onset" of the crossing, "threshold" (cvar
+        at the target), and the "Splot", "SpolPlot", "cvar" and "crel" of
+        every front solved, in order of position, with their "logs". If
+        crel doesn't cross the target, the crossing is NaN, except at 1
+        when the front is stable all the way from the target, where the
+        onset is the target. Only the "logs" if a front failed to converge
+    """
+    if SparMax is None:
+        SparMax = d["S"][d["Xpoint"] - 1]
+
+    si, integralinterp, options = _single_front_inputs(
+        constants, radios, d, SparMax, control_variable, kwargs
+    )
+    st = SimulationState(si)
+
+    # Solutions (SparFront, cvar, Tu) by grid point, for the warm starts
+    known = {}
+    # cvar as in the output of run_dls
+    cvar = {}
+    # More power holds the front nearer the target, so stable fronts are
+    # where crel decreases with distance from it
+    sign = -1 if control_variable == "power" else 1
+
+    def error(point):
+        # Relative to the target value, or None if the front didn't converge
+        print(f"{si.S[point]:.2f}...", end="")
+        if not _solve_single_front(si, st, integralinterp, point, known, options):
+            return None
+        cvar[point] = _output_cvar(si, st.cvar)
+        return sign * (cvar[point] / cvar[0] - crel)
 
+    t0 = timer()
     print("Solving...", end="")
 
-    """------SOLVE------"""
-    for idx, SparFront in enumerate(
-        si.SparRange
-    ):  # For each detachment front location:
-        st.SparFront = SparFront  # Current prescribed parallel front location
+    seeds = _seed_points(si.S, SparMax, n_seed)
+    errors = [error(point) for point in seeds]
+    if None in errors:
+        return {"logs": st.log}
+    bracket = _upward_crossing(seeds, errors)
+
+    if bracket is None:
+        spar_onset = spol_onset = np.nan
+        if crel == 1 and min(errors) >= 0:
+            # Stable all the way from the target
+            spar_onset, spol_onset = si.S[0], si.Spol[0]
+        else:
+            print(f"WARNING: crel doesn't cross {crel} up to SparMax={SparMax:.2f}")
+    else:
+        bracket = _narrow_bracket(si.S, error, *bracket, xtol)
+        if bracket is None:
+            return {"logs": st.log}
+        spar_onset, spol_onset = _interpolate_crossing(si, *bracket)
+
+    print(f"Complete in {timer() - t0:.1f} seconds")
+
+    points = sorted(cvar)
+    cvar = np.array([cvar[point] for point in points])
+    return {
+        "spar_onset": float(spar_onset),
+        "spol_onset": float(spol_onset),
+        "threshold": cvar[0],
+        "Splot": si.S[points],
+        "SpolPlot": si.Spol[points],
+        "cvar": cvar,
+        "crel": cvar / cvar[0],
+        "logs": {si.S[point]: st.log[si.S[point]] for point in points},
+        "constants": constants,
+        "radios": radios,
+        "state": st,
+    }
+
+
+def solve_front_position(
+    constants: dict,
+    radios: dict,
+    d: dict,
+    cvar_value: float,
+    control_variable: str = "impurity_frac",
+    curve: Optional[dict] = None,
+    SparMax: Optional[float] = None,
+    xtol: float = 0,
+    n_seed: int = 5,
+    **kwargs,
+) -> dict:
+    """Find the front position for a given value of the control variable,
+    the inverse of `run_dls`
+
+    The front position is where cvar crosses ``cvar_value``, taking the
+    stable crossing as in `find_onset`. With a ``curve`` of cvar against
+    front position from an earlier solve, the search starts from the
+    position interpolated from it, warm started from the nearest fronts
+    of the curve, and steps out by 1, 2, 4, ... grid points until the
+    crossing is bracketed. With a good curve, this is usually two fronts.
+    Otherwise, the crossing is bracketed with ``n_seed`` evenly spaced
+    fronts as in `find_onset`. Either way, the bracket is then narrowed
+    down to neighbouring grid points, and the front position interpolated
+    linearly between them.
 
-        if dynamicGrid:
-            newProfile = refineGrid(
-                d,
-                SparFront,
-                fine_ratio=dynamicGridRefinementRatio,
-                width=dynamicGridRefinementWidth,
-                diagnostic_plot=dynamicGridDiagnosticPlot,
-            )
-            si.Xpoint = newProfile["Xpoint"]
-            si.S = newProfile["S"]
-            si.Spol = newProfile["Spol"]
-            si.Btot = newProfile["Btot"]
-            si.Bpol = newProfile["Bpol"]
-            si.B = interpolate.interp1d(
-                si.S, si.Btot, kind="cubic"
-            )  # TODO: is this necessary?  We have Btot already
+    Parameters
+    ----------
+    cvar_value:
+        Value of the control variable, in the units of the output of
+        `run_dls`
+    curve:
+        Output of `run_dls`, `run_dls_adaptive`, `find_onset` or
+        `solve_front_position` for the same inputs, apart from the
+        control variable, on the same grid
+    SparMax:
+        Last front position. Defaults to just below the X-point
+    xtol:
+        Stop when the bracket is narrower than this, in metres parallel.
+        By default, stops when its ends are neighbouring grid points
+    n_seed:
+        Number of front positions to bracket the crossing with, without a
+        curve
+    control_variable:
+        As for `run_dls`
+    kwargs:
+        Passed on to `run_dls`, which takes the ``verbosity``, ``Ctol``,
+        ``Ttol``, ``URF``, ``timeout``, ``zero_qpllt``, ``root_method``,
+        ``solve_mode``, ``bracket_batch``, ``backend`` and ``ode_method``
+
+    Returns
+    -------
+    output : dict
+        "SparFront" and "SpolFront", the front position, which is the
+        target if cvar_value is below the detachment threshold and NaN
+        if the front would be past SparMax. As for `run_dls`, the
+        "Splot", "SpolPlot", "cvar", profiles and "logs" of each front
+        solved, in order of position. "index" is that of the front
+        nearest the front position. Only the "logs" if a front failed to
+        converge
+    """
+    if SparMax is None:
+        SparMax = d["S"][d["Xpoint"] - 1]
 
-            # Find index of front location on new grid
-            SparFrontOld = si.SparRange[idx]
-            point = st.point = np.argmin(abs(si.S - SparFrontOld))
+    si, integralinterp, options = _single_front_inputs(
+        constants, radios, d, SparMax, control_variable, kwargs
+    )
+    st = SimulationState(si)
+
+    known = {} if curve is None else _curve_solutions(si, curve)
+    # Stable fronts need more cvar further from the target, except for power
+    sign = -1 if control_variable == "power" else 1
+    # Output of each front solved, by grid point
+    fronts = {}
+
+    def error(point):
+        # Relative to cvar_value, or None if the front didn't converge
+        print(f"{si.S[point]:.2f}...", end="")
+        if not _solve_single_front(si, st, integralinterp, point, known, options):
+            return None
+        front = fronts[point] = defaultdict(list)
+        front["Splot"].append(si.S[point])
+        front["SpolPlot"].append(si.Spol[point])
+        _collect_profiles(si, st, front)
+        return sign * (front["cvar"][0] / cvar_value - 1)
+
+    t0 = timer()
+    print("Solving...", end="")
 
+    last = np.argmin(abs(si.S - SparMax))
+    if known:
+        # Start from the position interpolated from the curve
+        points = np.array(sorted(known))
+        errors = [
+            sign * (_output_cvar(si, known[p][1]) / cvar_value - 1) for p in points
+        ]
+        bracket = _upward_crossing(points, errors)
+        if bracket is None:
+            start = points[np.argmin(np.abs(errors))]
         else:
-            point = st.point = np.argmin(abs(d["S"] - SparFront))
+            start = np.argmin(abs(si.S - _interpolate_crossing(si, *bracket)[0]))
+        bracket, end_error = _step_out(error, min(start, last), last)
+        if bracket is None and end_error is None:
+            return {"logs": st.log}
+        attached = bracket is None and end_error >= 0
+    else:
+        seeds = _seed_points(si.S, SparMax, n_seed)
+        errors = [error(point) for point in seeds]
+        if None in errors:
+            return {"logs": st.log}
+        bracket = _upward_crossing(seeds, errors)
+        attached = min(errors) >= 0
+
+    if bracket is not None:
+        bracket = _narrow_bracket(si.S, error, *bracket, xtol)
+        if bracket is None:
+            return {"logs": st.log}
+        SparFront, SpolFront = _interpolate_crossing(si, *bracket)
+    elif attached:
+        # Below the detachment threshold
+        SparFront, SpolFront = si.S[0], si.Spol[0]
+    else:
+        SparFront = SpolFront = np.nan
+        print(
+            f"WARNING: the front is past SparMax={SparMax:.2f} with "
+            f"{control_variable} {cvar_value:.3g}"
+        )
 
-        print(f"{SparFront:.2f}...", end="")
+    print(f"Complete in {timer() - t0:.1f} seconds")
 
-        """------INITIAL GUESSES------"""
+    output = defaultdict(list)
+    for point in sorted(fronts):
+        for key, value in fronts[point].items():
+            output[key].append(value[0])
+    output["logs"] = {si.S[point]: st.log[si.S[point]] for point in sorted(fronts)}
+    output["SparFront"] = float(SparFront)
+    output["SpolFront"] = float(SpolFront)
+    if np.isfinite(SparFront):
+        output["index"] = int(np.argmin(np.abs(np.array(output["Splot"]) - SparFront)))
+    output["constants"] = constants
+    output["radios"] = radios
+    output["state"] = st
 
-        # Current set of parallel position coordinates
-        st.s = si.S[point:]
-        output["Splot"].append(si.S[point])
-        output["SpolPlot"].append(si.Spol[point])
-
-        # Inital guess for the value of qpll integrated across connection length
-        qavLguess = 0
-        if si.radios["upstreamGrid"]:
-            if st.s[0] < si.S[si.Xpoint]:
-                qavLguess = (
-                    (si.qpllu0) * (si.S[si.Xpoint] - st.s[0])
-                    + (si.qpllu0 / 2) * (st.s[-1] - si.S[si.Xpoint])
-                ) / (st.s[-1] - si.S[0])
-            else:
-                qavLguess = si.qpllu0 / 2
+    return dict(output)
+
+
+def _single_front_inputs(constants, radios, d, SparMax, control_variable, kwargs):
+    """Set up solving single fronts between the target and SparMax, as in
+    `find_onset` and `solve_front_position`, with the keyword arguments
+    ``kwargs`` of `run_dls` and its defaults for the rest
+
+    Returns the SimulationInputs, the cooling curve integral and the
+    options for `_solve_single_front`
+    """
+    unknown = set(kwargs) - set(_SINGLE_FRONT_KWARGS)
+    if unknown:
+        raise TypeError(f"Unexpected keyword arguments {sorted(unknown)}")
+    defaults = inspect.signature(run_dls).parameters
+    kwargs = {
+        key: kwargs.get(key, defaults[key].default) for key in _SINGLE_FRONT_KWARGS
+    }
+
+    backend = _check_options(
+        kwargs["root_method"],
+        kwargs["solve_mode"],
+        kwargs["backend"],
+        kwargs["ode_method"],
+    )
+    si, integralinterp = _simulation_inputs(
+        constants,
+        radios,
+        d,
+        [0, SparMax],
+        control_variable,
+        kwargs["verbosity"],
+        kwargs["Ctol"],
+        kwargs["Ttol"],
+        kwargs["URF"],
+        kwargs["timeout"],
+        backend,
+        kwargs["ode_method"],
+    )
+    options = {
+        key: kwargs[key]
+        for key in ("zero_qpllt", "root_method", "solve_mode", "bracket_batch")
+    }
+    return si, integralinterp, options
+
+
+def _solve_single_front(si, st, integralinterp, point, known, options):
+    """Solve the front at grid point ``point``, warm starting by
+    interpolating the nearest solutions in known, and add it to known
+
+    known is a dict of (SparFront, cvar, Tu) by grid point. options are the
+    zero_qpllt, root_method, solve_mode and bracket_batch of `run_dls`.
+    Returns False if the temperature loop didn't converge
+    """
+    st.SparFront = si.S[point]
+    st.point = point
+    _initial_guess(si, st, integralinterp, options["zero_qpllt"])
+
+    # The nearest solution either side, or the nearest two to one side,
+    # nearest last
+    below = sorted(p for p in known if p < point)
+    above = sorted(p for p in known if p > point)
+    neighbours = [below[-1], above[0]] if below and above else below[-2:] or above[:2]
+    neighbours.sort(key=lambda p: -abs(si.S[p] - si.S[point]))
+
+    bracket_step = None
+    if neighbours:
+        st.cvar, st.Tu, bracket_step = _extrapolate_solution(
+            st.SparFront, [known[p] for p in neighbours], order=1
+        )
+
+    complete, _ = _solve_front(
+        si,
+        st,
+        bracket_step,
+        None,
+        bool(neighbours),
+        options["root_method"],
+        options["solve_mode"],
+        options["bracket_batch"],
+    )
+    if complete:
+        known[point] = (st.SparFront, st.cvar, st.Tu)
+    return complete
+
+
+def _output_cvar(si, cvar):
+    """cvar as in the output of `run_dls`, which is the heat flux for power"""
+    return 1 / cvar if si.control_variable == "power" else cvar
+
+
+def _curve_solutions(si, curve):
+    """(SparFront, cvar, Tu) by grid point of the fronts in the output of an
+    earlier solve, for warm starts"""
+    Tus = [log["Tu"][-1] for log in curve["logs"].values()]
+    if len(Tus) != len(curve["cvar"]):
+        raise ValueError("curve needs a log for each front position")
+
+    return {
+        np.argmin(abs(si.S - Splot)): (Splot, _output_cvar(si, cvar), Tu)
+        for Splot, cvar, Tu in zip(curve["Splot"], curve["cvar"], Tus)
+    }
+
+
+def _seed_points(S, SparMax, n_seed):
+    """Grid points nearest to n_seed evenly spaced front positions"""
+    return np.unique(
+        np.argmin(abs(S[:, None] - np.linspace(0, SparMax, n_seed)), axis=0)
+    )
+
+
+def _upward_crossing(points, errors):
+    """Bracket (lower, upper, error at lower, error at upper) of the first
+    crossing upwards through zero of errors after their lowest, or None"""
+    lowest = np.argmin(errors)
+    above = np.flatnonzero(np.array(errors[lowest:]) > 0)
+    if errors[lowest] >= 0 or not len(above):
+        return None
+    first = lowest + above[0]
+    return points[first - 1], points[first], errors[first - 1], errors[first]
+
+
+def _step_out(error, point, last):
+    """Bracket a crossing of error through zero by stepping out from grid
+    point in steps of 1, 2, 4, ... towards it, up to 0 or last
+
+    Returns
+    -------
+    bracket : tuple or None
+        As for `_upward_crossing`, or None if it wasn't found
+    end_error : float or None
+        Error at 0 or last if the crossing wasn't found, None if a front
+        didn't converge
+    """
+    f_point = error(point)
+    step = 1
+    while f_point is not None:
+        # Fronts further from the target need more cvar
+        new = min(max(point + (step if f_point < 0 else -step), 0), last)
+        if new == point:
+            return None, f_point
+        f_new = error(new)
+        if f_new is not None and (f_new > 0) != (f_point > 0):
+            if new < point:
+                return (new, point, f_new, f_point), f_new
+            return (point, new, f_point, f_new), f_new
+        point, f_point = new, f_new
+        step *= 2
+    return None, None
+
+
+def _narrow_bracket(S, error, lower, upper, f_lower, f_upper, xtol):
+    """Narrow down a bracket of grid points around a crossing of error
+    through zero with `rootFinding.ITP`, until its ends are neighbouring
+    grid points or closer than xtol. None if a front didn't converge"""
+    # Resolution for the worst case number of solves
+    resolution = max(xtol, np.min(np.diff(S[lower : upper + 1])))
+    finder = ITP(S[lower], f_lower, S[upper], f_upper, rtol=resolution / S[upper])
+    while upper - lower > 1 and S[upper] - S[lower] > xtol:
+        # Nearest grid point to the proposal strictly inside the bracket
+        point = np.argmin(abs(S - finder.propose()))
+        point = min(max(point, lower + 1), upper - 1)
+
+        f_point = error(point)
+        if f_point is None:
+            return None
+        finder.update(S[point], f_point)
+        if np.sign(f_point) == np.sign(f_lower):
+            lower, f_lower = point, f_point
         else:
-            qavLguess = si.qpllu0
+            upper, f_upper = point, f_point
 
-        # Inital guess for upstream temperature based on guess of qpll ds integral
-        Tu0 = ((7 / 2) * qavLguess * (st.s[-1] - st.s[0]) / si.kappa0) ** (2 / 7)
-        st.Tu = Tu0
-        st.Pu0 = (
-            Tu0 * si.nu0 * si.echarge
-        )  # Initial upstream pressure in Pa, calculated so it can be kept constant if required
+    return lower, upper, f_lower, f_upper
 
-        # Cooling curve integral
-        Lint = cumulative_trapezoid(si.Lz[1] * np.sqrt(si.Lz[0]), si.Lz[0], initial=0)
-        integralinterp = interpolate.interp1d(si.Lz[0], Lint)
 
-        # Guesses/initialisations for control variables assuming qpll0 everywhere and qpll=0 at target
+def _interpolate_crossing(si, lower, upper, f_lower, f_upper):
+    """Parallel and poloidal positions of a crossing through zero,
+    interpolating linearly between grid points lower and upper"""
+    weight = f_lower / (f_lower - f_upper)
+    return (
+        si.S[lower] + weight * (si.S[upper] - si.S[lower]),
+        si.Spol[lower] + weight * (si.Spol[upper] - si.Spol[lower]),
+    )
 
-        if si.control_variable == "impurity_frac":
-            # Initial guess of cz0 assuming qpll0 everywhere and qpll=0 at target
-            cz0_guess = (si.qpllu0**2) / (
-                2 * si.kappa0 * si.nu0**2 * st.Tu**2 * integralinterp(st.Tu)
-            )
-            st.cvar = cz0_guess
 
-        elif si.control_variable == "density":
-            # Initial guess of nu0 assuming qpll0 everywhere and qpll=0 at target
-            nu0_guess = np.sqrt(
-                (si.qpllu0**2)
-                / (2 * si.kappa0 * si.cz0 * st.Tu**2 * integralinterp(st.Tu))
-            )
-            st.cvar = nu0_guess
-
-        elif si.control_variable == "power":
-            # nu0 and cz0 guesses are from Lengyel which depends on an estimate of Tu using qpllu0
-            # This means we cannot make a more clever guess for qpllu0 based on cz0 or nu0
-            qpllu0_guess = si.qpllu0
-            # qradial_guess = qpllu0_guess / trapezoid(si.Btot[si.Xpoint:] / si.Btot[si.Xpoint], x = si.S[si.Xpoint:])
-            qradial_guess = (qpllu0_guess / si.Btot[si.Xpoint]) / trapezoid(
-                1 / si.Btot[si.Xpoint :], x=si.S[si.Xpoint :]
-            )
-            st.cvar = 1 / qradial_guess
+def _check_options(root_method, solve_mode, backend, ode_method):
+    """Check the solver options of `run_dls`, and return the backend to
+    use"""
+    if root_method not in ROOT_FINDERS:
+        raise ValueError(
+            f"Unknown root_method '{root_method}', expected one of {list(ROOT_FINDERS)}"
+        )
 
-        # Initial guess of qpllt, the virtual target temperature (typically 0).
-        if zero_qpllt:
-            st.qpllt = si.qpllu0 * 1e-2
-        else:
-            st.qpllt = (
-                si.gamma_sheath
-                / 2
-                * si.nu0
-                * st.Tu
-                * si.echarge
-                * np.sqrt(2 * si.Tt * si.echarge / si.mi)
-            )
+    if solve_mode not in {"nested", "broyden", "bvp"}:
+        raise ValueError(
+            f"Unknown solve_mode '{solve_mode}', expected 'nested', 'broyden' or 'bvp'"
+        )
 
-        """------INITIALISATION------"""
-        st.error1 = 1  # Inner loop error (error in qpllu based on provided cz/ne)
-        st.error0 = 1  # Outer loop residual in upstream temperature
-        # Upstream conditions
-        st.nu = si.nu0
-        st.cz = si.cz0
-        st.qradial = (si.qpllu0 / si.Btot[si.Xpoint]) / trapezoid(
-            1 / si.Btot[si.Xpoint :], x=si.S[si.Xpoint :]
+    if backend not in BACKENDS:
+        raise ValueError(
+            f"Unknown backend '{backend}', expected one of {list(BACKENDS)}"
         )
 
-        st.update_log()
+    if ode_method not in ODE_METHODS:
+        raise ValueError(
+            f"Unknown ode_method '{ode_method}', expected one of {ODE_METHODS}"
+        )
 
-        # Tu convergence loop
-        for k0 in range(si.timeout):
-            # Initialise
-            st = iterate(si, st)
+    if backend == "numba" and not numbaBackend.HAVE_NUMBA:
+        print("WARNING: numba is not installed, using the SciPy backend")
+        return "scipy"
+    return backend
 
-            """------INITIAL SOLUTION BOUNDING------"""
 
-            # Double or halve cvar until the error flips sign
-            for k1 in range(si.timeout * 2):
-                if st.error1 > 0:
-                    st.cvar /= 2
-                elif st.error1 < 0:
-                    st.cvar *= 2
+def _finish_output(output, st, constants, radios):
+    """Add the scan results and the inputs to the per front output of a
+    solve, as a regular dict"""
+    _scan_results(output, st)
+    if "cache_lookups" in output:
+        # Fraction of iterates reused from the per front cache
+        output["cache_hit_rate"] = sum(output["cache_hits"]) / max(
+            sum(output["cache_lookups"]), 1
+        )
+    output["constants"] = constants
+    output["radios"] = radios
+    output["state"] = st
 
-                st = iterate(si, st)
+    # Convert back to regular dict
+    return dict(output)
+
+
+# Results of run_dls(outputs="scalars")
+_SCALARS = ("threshold", "window", "window_frac", "window_ratio")
+
+
+def _scalar_results(output):
+    """The scalar results of a scan, or the logs if it failed"""
+    if "threshold" not in output:
+        return output
+    return {key: output[key] for key in _SCALARS if key in output}
+
+
+def _solve_fronts(
+    constants,
+    radios,
+    d,
+    SparRange,
+    control_variable,
+    verbosity,
+    Ctol,
+    Ttol,
+    URF,
+    timeout,
+    dynamicGrid,
+    dynamicGridRefinementRatio,
+    dynamicGridRefinementWidth,
+    dynamicGridDiagnosticPlot,
+    zero_qpllt,
+    warm_start,
+    root_method,
+    solve_mode,
+    bracket_batch,
+    backend,
+    ode_method,
+    analytic_start,
+    outputs,
+):
+    """Solve at each front position in SparRange in turn
+
+    Parameters are as for `run_dls`.
+
+    Returns
+    -------
+    output : dict
+        Per front position results, before the post-processing of the scan
+    st : SimulationState
+        State at the last front position
+    complete : bool
+        False if a temperature loop failed to converge, in which case
+        output only holds the logs
+    """
+    si, integralinterp = _simulation_inputs(
+        constants,
+        radios,
+        d,
+        SparRange,
+        control_variable,
+        verbosity,
+        Ctol,
+        Ttol,
+        URF,
+        timeout,
+        backend,
+        ode_method,
+    )
 
-                if np.sign(st.log[st.SparFront]["error1"][k1 + 1]) != np.sign(
-                    st.log[st.SparFront]["error1"][k1 + 2]
-                ):  # It's initialised with a 1 already, hence k1+1 and k1+2
-                    break
+    # Initialise simulation state object
+    st = SimulationState(si)
 
-                if k1 == si.timeout - 1:
-                    raise Exception("Initial bounding failed")
+    # Initialise output dictionary
+    output = defaultdict(list)
 
-            if st.cvar < 1e-6 and si.control_variable == "impurity_fraction":
-                raise Exception("Required impurity fraction is tending to zero")
+    # Converged (SparFront, cvar, Tu) at each front position, for warm starts
+    converged = []
+    # Jacobian of the coupled solve, reused between fronts with warm starts
+    jacobian = None
+    # Analytic control parameter at each front position, for analytic starts
+    if analytic_start:
+        analytic = _analytic_profile(si)
+
+    """------SOLVE------"""
+    for idx, SparFront in enumerate(
+        si.SparRange
+    ):  # For each detachment front location:
+        st.SparFront = SparFront  # Current prescribed parallel front location
 
-            # We have bounded the problem -  the last two iterations
-            # are on either side of the solution
-            st.lower_bound = min(
-                st.log[st.SparFront]["cvar"][-1], st.log[st.SparFront]["cvar"][-2]
+        if dynamicGrid:
+            newProfile = refineGrid(
+                d,
+                SparFront,
+                fine_ratio=dynamicGridRefinementRatio,
+                width=dynamicGridRefinementWidth,
+                diagnostic_plot=dynamicGridDiagnosticPlot,
             )
-            st.upper_bound = max(
-                st.log[st.SparFront]["cvar"][-1], st.log[st.SparFront]["cvar"][-2]
+            si.set_geometry(
+                newProfile["S"],
+                newProfile["Spol"],
+                newProfile["Btot"],
+                newProfile["Bpol"],
+                newProfile["Xpoint"],
             )
+            # Cached iterates are on the old grid
+            st.cache = {}
 
-            """------INNER LOOP------"""
+            # Find index of front location on new grid
+            SparFrontOld = si.SparRange[idx]
+            st.point = np.argmin(abs(si.S - SparFrontOld))
 
-            for k2 in range(si.timeout):
-                # New cvar guess is halfway between the upper and lower bound.
-                st.cvar = st.lower_bound + (st.upper_bound - st.lower_bound) / 2
+        else:
+            st.point = np.argmin(abs(d["S"] - SparFront))
 
-                st = iterate(si, st)
+        print(f"{SparFront:.2f}...", end="")
 
-                # Narrow bounds based on the results.
-                if st.error1 < 0:
-                    st.lower_bound = st.cvar
-                elif st.error1 > 0:
-                    st.upper_bound = st.cvar
+        """------INITIAL GUESSES------"""
+        _initial_guess(si, st, integralinterp, zero_qpllt)
+        output["Splot"].append(si.S[st.point])
+        output["SpolPlot"].append(si.Spol[st.point])
+
+        # Relative size of the first step when bracketing cvar. None means
+        # doubling/halving straight away
+        bracket_step = None
+
+        # Warm start from the solutions at previous front positions. qpllt
+        # keeps the cold start Tu above so the solution doesn't depend on it
+        if warm_start and converged:
+            st.cvar, st.Tu, bracket_step = _extrapolate_solution(SparFront, converged)
+        elif analytic_start and converged:
+            st.cvar, st.Tu, bracket_step = _analytic_guess(
+                si, analytic[:, idx] / analytic[:, 0], converged[0][1:]
+            )
 
-                # Looser tolerance for the first two T iterations
-                tolerance = 1e-2 if k0 < 2 else si.Ctol
+        """------SOLVE------"""
+        complete, jacobian = _solve_front(
+            si,
+            st,
+            bracket_step,
+            jacobian if warm_start else None,
+            warm_start,
+            root_method,
+            solve_mode,
+            bracket_batch,
+        )
+        if not complete:
+            output["logs"] = st.log
+            return output, st, False
+
+        converged.append((SparFront, st.cvar, st.Tu))
+        if outputs == "scalars":
+            # Only the logs of a front that failed are returned
+            del st.log[SparFront]
+        output["cache_hits"].append(st.cache_hits)
+        output["cache_lookups"].append(st.cache_lookups)
+        st.previous_front = (st.s, st.q / si.B(st.s), st.T, st.cvar, st.Tu)
 
-                # Break on success
-                if abs(st.error1) < tolerance:
-                    break
+        """------COLLECT PROFILE DATA------"""
+        _collect_profiles(si, st, output, profiles=outputs == "full")
 
-                if k2 == si.timeout - 1 and verbosity > 0:
-                    print("\nWARNING: Failed to converge control variable loop")
+    output["logs"] = st.log  # Append log with all front positions
 
-            """------OUTER LOOP------"""
-            # Upstream temperature error
-            st.error0 = (st.Tu - st.Tucalc) / st.Tu
+    return output, st, True
 
-            # Calculate new Tu, under-relax by URF
-            st.Tu = (1 - si.URF) * st.Tu + si.URF * st.Tucalc
 
-            st.update_log()
+def _run_combined(arguments, control_variables):
+    """Solve `run_dls` for the impurity fraction, and derive the outputs for
+    each of control_variables from it"""
+    unknown = set(control_variables) - {"impurity_frac", "density"}
+    if unknown:
+        raise ValueError(
+            f"Can only solve impurity_frac and density together, not {sorted(unknown)}"
+        )
 
-            # Break on outer (temperature) loop success
-            if abs(st.error0) < si.Ttol:
-                if verbosity > 2:
-                    print(f"\n Converged temperature loop in {k0} iterations")
-                break
-            if k0 == si.timeout:
-                output["logs"] = st.log
-                print("Failed to converge temperature loop, exiting and returning logs")
-                return output
+    output = run_dls(**arguments)
+    if "state" not in output:
+        # Failed to converge, so there are only the logs
+        return dict.fromkeys(control_variables, output)
 
-        """------COLLECT PROFILE DATA------"""
+    return {
+        control_variable: _derived_output(
+            output, control_variable, arguments["zero_qpllt"]
+        )
+        for control_variable in control_variables
+    }
 
-        if si.control_variable == "power":
-            output["cvar"].append(1 / st.cvar)  # so that output is in Wm-2
-        else:
-            output["cvar"].append(st.cvar)
-
-        Qrad = []
-        for Tf in st.T:
-            if si.control_variable == "impurity_frac":
-                Qrad.append(((si.nu0**2 * st.Tu**2) / Tf**2) * st.cvar * si.Lfunc(Tf))
-            elif si.control_variable == "density":
-                Qrad.append(((st.cvar**2 * st.Tu**2) / Tf**2) * si.cz0 * si.Lfunc(Tf))
-            elif si.control_variable == "power":
-                Qrad.append(((si.nu0**2 * st.Tu**2) / Tf**2) * si.cz0 * si.Lfunc(Tf))
-
-        # Pad some profiles with zeros to ensure same length as S
-        output["Sprofiles"].append(si.S)
-        output["Tprofiles"].append(pad_profile(si.S, st.T))
-        output["Rprofiles"].append(pad_profile(si.S, Qrad))  # Radiation in W/m3
-        output["Qprofiles"].append(pad_profile(si.S, st.q))  # Heat flux in W/m2
-        output["Spolprofiles"].append(si.Spol)
-        output["Btotprofiles"].append(np.array(si.Btot))
-        output["Bpolprofiles"].append(np.array(si.Bpol))
-        output["Xpoints"].append(si.Xpoint)
-        output["Wradials"].append(st.qradial)
 
-    output["logs"] = st.log  # Append log with all front positions
+def _derived_output(output, control_variable, zero_qpllt):
+    """Output of `run_dls` for control_variable, from the output of a solve
+    for the impurity fraction
 
-    """------COLLECT RESULTS------"""
-    if len(SparRange) > 1:
+    The Lengyel function only depends on nu**2 * cz, so the density with
+    impurity fraction cz0 that gives the same radiation is
+    nu0 * sqrt(cz / cz0). The profiles are the same.
+
+    Unless zero_qpllt is set, the target heat flux qpllt is worked out from
+    nu0 rather than the solved density, which is only consistent if the two
+    are the same. The relative difference is added to the output as
+    "qpllt_mismatch". There is a warning if setting qpllt from the solved
+    density instead would change error1 by more than Ctol at the front
+    position with the biggest mismatch. The logs are those of the impurity
+    fraction solve.
+    """
+    st = output["state"]
+    si = st.si
+    derived = dict(output)
+
+    nu = si.nu0
+    if control_variable == "density":
+        nu = si.nu0 * np.sqrt(np.asarray(output["cvar"]) / si.cz0)
+        derived["cvar"] = nu
+        _scan_results(derived, st)
+        derived["threshold"] = nu[0]
+
+    derived["qpllt_mismatch"] = np.zeros(len(output["cvar"]))
+    # With the impurity fraction, the upstream density is nu0 so there is
+    # no mismatch to check
+    if not zero_qpllt and control_variable != "impurity_frac":
+        derived["qpllt_mismatch"] += nu / si.nu0 - 1
+        worst = np.argmax(np.abs(derived["qpllt_mismatch"]))
+        mismatch = derived["qpllt_mismatch"][worst]
+        change = _qpllt_sensitivity(si, output["logs"], worst, 1 + mismatch)
+        if abs(change) > si.Ctol:
+            print(
+                f"WARNING: qpllt is set from nu0, which differs from the {control_variable} "
+                f"solution's upstream density by up to {abs(mismatch):.1%}. Setting it from "
+                f"the solved density would change error1 by {abs(change):.1%}"
+            )
+
+    return derived
+
+
+def _qpllt_sensitivity(si, logs, index, scale):
+    """Change in error1 at the solution at the index-th front position in
+    logs if its target heat flux qpllt is multiplied by scale"""
+    SparFront = list(logs)[index]
+    log = logs[SparFront]
+
+    st = SimulationState(si)
+    st.SparFront = SparFront
+    st.point = np.argmin(abs(si.S - SparFront))
+    st.s = si.S[st.point :]
+    st.cvar, st.Tu = log["cvar"][-1], log["Tu"][-1]
+
+    error1 = []
+    for qpllt in (log["qpllt"][-1], log["qpllt"][-1] * scale):
+        st.qpllt = qpllt
+        si.iterate(si, st)
+        error1.append(st.error1)
+    return error1[1] - error1[0]
+
+
+def _scan_results(output, st):
+    """Add the threshold, window and detachment onset of the scan to output"""
+    if len(output["cvar"]) > 1:
         # Here we calculate things like window, threshold etc from a whole scan.
 
         # Relative control variable:
@@ -566,17 +1443,854 @@ def run_dls(
         output["window_frac"] = output["window"] / output["threshold"]  # (Cx - Ct) / Ct
         output["window_ratio"] = cvar_list[-1] / cvar_list[0]  # Cx / Ct
 
-    elif len(SparRange) == 1:
+    elif len(output["cvar"]) == 1:
         output["crel"] = 1
         output["threshold"] = st.cvar
-    output["constants"] = constants
-    output["radios"] = si.radios
-    output["state"] = st
 
-    # Convert back to regular dict
-    output = dict(output)
-    t1 = timer()
 
-    print(f"Complete in {t1 - t0:.1f} seconds")
+def _simulation_inputs(
+    constants,
+    radios,
+    d,
+    SparRange,
+    control_variable,
+    verbosity,
+    Ctol,
+    Ttol,
+    URF,
+    timeout,
+    backend="scipy",
+    ode_method="RK45",
+):
+    """Set up the SimulationInputs for `run_dls`
+
+    Returns
+    -------
+    si : SimulationInputs
+        Simulation input object containing all constant parameters
+    integralinterp : callable
+        Cooling curve integral, for the initial guesses of cvar
+    """
+    # Initialise simulation inputs object
+    si = SimulationInputs()
 
-    return output
+    # Add inputs to SimulationInputs
+    si.update(**constants)
+    si.verbosity = verbosity
+    si.Ctol = Ctol
+    si.Ttol = Ttol
+    si.URF = URF
+    si.timeout = timeout
+    si.radios = radios
+    si.control_variable = control_variable
+
+    # Extract topology data
+    si.set_geometry(d["S"], d["Spol"], d["Btot"], d["Bpol"], d["Xpoint"])
+    si.SparRange = SparRange
+    # si.indexRange = [np.argmin(abs(d["S"] - x)) for x in SparRange] # Indices of topology arrays to solve code at
+    # si.indexRange = np.unique(si.indexRange)   # Drop duplicates
+
+    # Cooling curve samples and their integral, for the initial guesses.
+    # These and the table below are memoised per cooling curve, so
+    # parameter scans only build them once
+    si.Lz, integralinterp = cooling_curve_integral(si.Lfunc)
+
+    si.Lfunc = _tabulate_Lfunc(si.Lfunc)
+
+    # Integrator for single iterates
+    si.iterate = BACKENDS[backend]
+    si.ode_method = ode_method
+
+    return si, integralinterp
+
+
+def _initial_guess(si, st, integralinterp, zero_qpllt):
+    """Initial guesses of Tu, cvar and qpllt for the front at st.point,
+    from the Lengyel estimate assuming qpll0 everywhere and qpll=0 at the
+    target"""
+    # Current set of parallel position coordinates
+    st.s = si.S[st.point :]
+
+    # Inital guess for the value of qpll integrated across connection length
+    qavLguess = 0
+    if si.radios["upstreamGrid"]:
+        if st.s[0] < si.S[si.Xpoint]:
+            qavLguess = (
+                (si.qpllu0) * (si.S[si.Xpoint] - st.s[0])
+                + (si.qpllu0 / 2) * (st.s[-1] - si.S[si.Xpoint])
+            ) / (st.s[-1] - si.S[0])
+        else:
+            qavLguess = si.qpllu0 / 2
+    else:
+        qavLguess = si.qpllu0
+
+    # Inital guess for upstream temperature based on guess of qpll ds integral
+    Tu0 = ((7 / 2) * qavLguess * (st.s[-1] - st.s[0]) / si.kappa0) ** (2 / 7)
+    st.Tu = Tu0
+    st.Pu0 = (
+        Tu0 * si.nu0 * si.echarge
+    )  # Initial upstream pressure in Pa, calculated so it can be kept constant if required
+
+    # Guesses/initialisations for control variables assuming qpll0 everywhere and qpll=0 at target
+
+    if si.control_variable == "impurity_frac":
+        # Initial guess of cz0 assuming qpll0 everywhere and qpll=0 at target
+        cz0_guess = (si.qpllu0**2) / (
+            2 * si.kappa0 * si.nu0**2 * st.Tu**2 * integralinterp(st.Tu)
+        )
+        st.cvar = cz0_guess
+
+    elif si.control_variable == "density":
+        # Initial guess of nu0 assuming qpll0 everywhere and qpll=0 at target
+        nu0_guess = np.sqrt(
+            (si.qpllu0**2) / (2 * si.kappa0 * si.cz0 * st.Tu**2 * integralinterp(st.Tu))
+        )
+        st.cvar = nu0_guess
+
+    elif si.control_variable == "power":
+        # nu0 and cz0 guesses are from Lengyel which depends on an estimate of Tu using qpllu0
+        # This means we cannot make a more clever guess for qpllu0 based on cz0 or nu0
+        qpllu0_guess = si.qpllu0
+        qradial_guess = (qpllu0_guess / si.geometry.Bx) / si.geometry.invB_integral
+        st.cvar = 1 / qradial_guess
+
+    # Initial guess of qpllt, the virtual target temperature (typically 0).
+    if zero_qpllt:
+        st.qpllt = si.qpllu0 * 1e-2
+    else:
+        st.qpllt = (
+            si.gamma_sheath
+            / 2
+            * si.nu0
+            * st.Tu
+            * si.echarge
+            * np.sqrt(2 * si.Tt * si.echarge / si.mi)
+        )
+
+
+def _solve_front(
+    si, st, bracket_step, jacobian, warm_start, root_method, solve_mode, bracket_batch
+):
+    """Solve for cvar and Tu at a single front position, starting from the
+    guesses in st
+
+    Parameters are as for `run_dls`, apart from:
+
+    bracket_step : float or None
+        Relative size of the first step when bracketing cvar. None means
+        doubling/halving straight away
+    jacobian : array or None
+        Initial Jacobian for the coupled solve
+
+    Returns
+    -------
+    complete : bool
+        False if the temperature loop failed to converge
+    jacobian : array or None
+        Jacobian of the coupled solve, for the next front
+    """
+    """------INITIALISATION------"""
+    st.error1 = 1  # Inner loop error (error in qpllu based on provided cz/ne)
+    st.error0 = 1  # Outer loop residual in upstream temperature
+    st.qpllu1 = 0
+    st.lower_bound = 0
+    st.upper_bound = 0
+    # Upstream conditions
+    st.nu = si.nu0
+    st.cz = si.cz0
+    st.qradial = (si.qpllu0 / si.geometry.Bx) / si.geometry.invB_integral
+    # Iterates reused at this front, see `_iterate_cached`
+    st.cache_hits = 0
+    st.cache_lookups = 0
+
+    st.new_log()
+    st.update_log()
+
+    # Given a good first guess, keep bracketing with small steps in the
+    # later Tu iterations too
+    small_steps = warm_start or bracket_step is not None
+
+    # Solve for cvar and Tu together, falling back to the nested loops below
+    # if that fails
+    if solve_mode == "broyden":
+        coupled, jacobian = _solve_coupled(si, st, jacobian)
+        if coupled:
+            st.update_log()
+            return True, jacobian
+
+        jacobian = None
+        if si.verbosity > 0:
+            print("\nWARNING: Coupled solve failed, falling back to nested loops")
+
+    # Solve as a boundary value problem, starting from the solution at the
+    # previous front position. If that fails, the nested loops below start
+    # bracketing from its cvar with small steps
+    if solve_mode == "bvp" and st.previous_front is not None:
+        if not warm_start:
+            st.cvar, st.Tu = st.previous_front[3:]
+        if _solve_bvp(si, st, st.previous_front):
+            st.update_log()
+            return True, jacobian
+
+        bracket_step = 1e-2
+        if si.verbosity > 0:
+            print("\nWARNING: BVP solve failed, falling back to nested loops")
+
+    # Tu convergence loop
+    for k0 in range(si.timeout):
+        # Initialise
+        _iterate_cached(si, st)
+
+        """------INITIAL SOLUTION BOUNDING------"""
+
+        # Double or halve cvar until the error flips sign. With a warm
+        # start, take small steps first and grow them up to doubling
+        n_probes = 0
+        for _ in range(si.timeout * 2):
+            if bracket_batch > 1:
+                # Integrate the next few steps at once
+                bracket_step, n = _bound_batch(si, st, bracket_step, bracket_batch)
+                n_probes += n
+            else:
+                factor = 2 if bracket_step is None else 1 + bracket_step
+                if st.error1 > 0:
+                    st.cvar /= factor
+                elif st.error1 < 0:
+                    st.cvar *= factor
+
+                if bracket_step is not None:
+                    bracket_step = 2 * bracket_step if bracket_step < 0.5 else None
+
+                _iterate_cached(si, st)
+                n_probes += 1
+
+            # Compare with the previous iteration
+            if np.sign(st.log[st.SparFront]["error1"][-1]) != np.sign(
+                st.log[st.SparFront]["error1"][-2]
+            ):
+                break
+
+            if n_probes >= si.timeout:
+                raise RuntimeError("Initial bounding failed")
+
+        if st.cvar < 1e-6 and si.control_variable == "impurity_fraction":
+            raise RuntimeError("Required impurity fraction is tending to zero")
+
+        # We have bounded the problem -  the last two iterations
+        # are on either side of the solution
+        log = st.log[st.SparFront]
+        st.lower_bound = min(log["cvar"][-1], log["cvar"][-2])
+        st.upper_bound = max(log["cvar"][-1], log["cvar"][-2])
+
+        root_finder = ROOT_FINDERS[root_method](
+            log["cvar"][-2],
+            log["error1"][-2],
+            log["cvar"][-1],
+            log["error1"][-1],
+        )
+
+        """------INNER LOOP------"""
+
+        for k2 in range(si.timeout):
+            # New cvar guess from the root finder, e.g. halfway between
+            # the upper and lower bound for bisection
+            st.cvar = root_finder.propose()
+
+            _iterate_cached(si, st)
+            root_finder.update(st.cvar, st.error1)
+
+            # Narrow bounds based on the results.
+            if st.error1 < 0:
+                st.lower_bound = st.cvar
+            elif st.error1 > 0:
+                st.upper_bound = st.cvar
+
+            # Looser tolerance for the first two T iterations
+            tolerance = 1e-2 if k0 < 2 else si.Ctol
+
+            # Break on success
+            if abs(st.error1) < tolerance:
+                break
+
+            if k2 == si.timeout - 1 and si.verbosity > 0:
+                print("\nWARNING: Failed to converge control variable loop")
+
+        """------OUTER LOOP------"""
+        # Upstream temperature error
+        st.error0 = (st.Tu - st.Tucalc) / st.Tu
+
+        # Calculate new Tu, under-relax by URF
+        st.Tu = (1 - si.URF) * st.Tu + si.URF * st.Tucalc
+
+        # cvar only needs to move by about as much as Tu did
+        if small_steps:
+            bracket_step = min(max(2 * abs(st.error0), 1e-3), 0.5)
+
+        st.update_log()
+
+        # Break on outer (temperature) loop success
+        if abs(st.error0) < si.Ttol:
+            if si.verbosity > 2:
+                print(f"\n Converged temperature loop in {k0} iterations")
+            break
+        if k0 == si.timeout:
+            print("Failed to converge temperature loop, exiting and returning logs")
+            return False, jacobian
+
+    return True, jacobian
+
+
+# Results of iterate stored by _iterate_cached
+_CACHED = ("q", "T", "Tucalc", "qpllu1", "error1", "cz", "nu", "qradial")
+
+
+def _iterate_cached(si, st):
+    """iterate, reusing the result of an earlier call at the same front
+    position, cvar, Tu and qpllt if there is one
+
+    Front positions which fall on the same grid point, and bracketing which
+    returns to an earlier cvar, repeat the same iterates. cvar and Tu are
+    rounded to 12 significant figures for the lookup. Only the iterates at
+    the current grid point are kept, so the cache is emptied whenever the
+    scan moves on to another point (or the grid changes).
+    """
+    if st.point != st.cache_point:
+        st.cache = {}
+        st.cache_point = st.point
+
+    key = (float(f"{st.cvar:.12g}"), float(f"{st.Tu:.12g}"), st.qpllt)
+    st.cache_lookups += 1
+
+    if key in st.cache:
+        st.cache_hits += 1
+        st.update(**st.cache[key])
+        st.update_log()
+        return st
+
+    si.iterate(si, st)
+    st.cache[key] = {param: st.get(param) for param in _CACHED}
+    return st
+
+
+# Outputs with a value per front position
+_FRONT_KEYS = (
+    "Splot",
+    "SpolPlot",
+    "cvar",
+    "Sprofiles",
+    "Tprofiles",
+    "Rprofiles",
+    "Qprofiles",
+    "Spolprofiles",
+    "Btotprofiles",
+    "Bpolprofiles",
+    "Xpoints",
+    "Wradials",
+    "cache_hits",
+    "cache_lookups",
+)
+
+
+def _collect_profiles(si, st, output, profiles=True):
+    """Append the converged cvar and, if profiles is set, the profiles at a
+    front position to output"""
+    if si.control_variable == "power":
+        output["cvar"].append(1 / st.cvar)  # so that output is in Wm-2
+    else:
+        output["cvar"].append(st.cvar)
+
+    if not profiles:
+        return
+
+    # Radiation profile, evaluating the cooling curve in one call
+    Tf = np.asarray(st.T)
+    Lf = evaluate_Lfunc(si.Lfunc, Tf)
+    if si.control_variable == "impurity_frac":
+        Qrad = ((si.nu0**2 * st.Tu**2) / Tf**2) * st.cvar * Lf
+    elif si.control_variable == "density":
+        Qrad = ((st.cvar**2 * st.Tu**2) / Tf**2) * si.cz0 * Lf
+    elif si.control_variable == "power":
+        Qrad = ((si.nu0**2 * st.Tu**2) / Tf**2) * si.cz0 * Lf
+
+    # Pad some profiles with zeros to ensure same length as S
+    output["Sprofiles"].append(si.S)
+    output["Tprofiles"].append(pad_profile(si.S, st.T))
+    output["Rprofiles"].append(pad_profile(si.S, Qrad))  # Radiation in W/m3
+    output["Qprofiles"].append(pad_profile(si.S, st.q))  # Heat flux in W/m2
+    output["Spolprofiles"].append(si.Spol)
+    output["Btotprofiles"].append(np.array(si.Btot))
+    output["Bpolprofiles"].append(np.array(si.Bpol))
+    output["Xpoints"].append(si.Xpoint)
+    output["Wradials"].append(st.qradial)
+
+
+def _tabulate_Lfunc(Lfunc):
+    """Tabulate the cooling curve so that each evaluation in the ODE
+    right-hand side is a lookup and a cubic. Curves whose table is off by
+    more than 0.1% (see `CoolingCurveTable.max_relative_error`) are
+    returned as they are"""
+    if isinstance(Lfunc, CoolingCurveTable):
+        return Lfunc
+    Lfunc_table = cooling_curve_table(Lfunc)
+    return Lfunc_table if Lfunc_table.max_relative_error < 1e-3 else Lfunc
+
+
+# Inputs shared by every block solved in a worker process of run_dls. These
+# are sent once per process rather than once per block
+_worker_inputs = {}
+
+
+def _init_worker(*inputs):
+    _worker_inputs["inputs"] = inputs
+
+
+def _solve_block(block, inputs=None):
+    """Solve a block of front positions, in a worker"""
+    constants, radios, d, options = inputs or _worker_inputs["inputs"]
+    output, st, complete = _solve_fronts(constants, radios, d, block, **options)
+    # The cooling curve may not be picklable. The caller has its own
+    st.si.Lfunc = None
+    return dict(output), st, complete
+
+
+def _solve_fronts_parallel(
+    constants, radios, d, SparRange, options, n_workers, executor
+):
+    """Solve the front positions in blocks over an executor, reassembling
+    the results in SparRange order
+
+    SparRange is split into ``n_workers`` contiguous blocks, solved in turn
+    as by `_solve_fronts`, so that the options which start from the
+    previous front (``warm_start``, ``analytic_start`` and
+    solve_mode="bvp") work along each block.
+
+    If no executor is given, a process pool of ``n_workers`` processes is
+    used. The inputs are then sent to each process once, by forking if
+    they can't be pickled (e.g. a cooling curve that is a closure or a
+    lambda).
+
+    Returns the same as `_solve_fronts`.
+    """
+    n_blocks = n_workers or os.cpu_count() or 1
+    blocks = [block for block in np.array_split(SparRange, n_blocks) if len(block)]
+
+    inputs = (constants, radios, d, options)
+
+    if executor is None:
+        context = None
+        try:
+            pickle.dumps(constants)
+        except (pickle.PicklingError, AttributeError, TypeError) as error:
+            if "fork" not in multiprocessing.get_all_start_methods():
+                raise TypeError(
+                    "constants must be picklable to solve in parallel on this "
+                    f"platform: {error}"
+                ) from error
+            context = multiprocessing.get_context("fork")
+
+        with ProcessPoolExecutor(
+            n_workers, mp_context=context, initializer=_init_worker, initargs=inputs
+        ) as pool:
+            results = list(pool.map(_solve_block, blocks))
+    else:
+        results = list(executor.map(_solve_block, blocks, [inputs] * len(blocks)))
+
+    # Stop at the first block that failed, as a serial solve would
+    failed = next(
+        (i for i, (_, _, complete) in enumerate(results) if not complete), None
+    )
+    if failed is not None:
+        results = results[: failed + 1]
+
+    output = defaultdict(list)
+    logs = {}
+    for block_output, _, _ in results:
+        for key, value in block_output.items():
+            if key == "logs":
+                logs.update(value)
+            else:
+                output[key].extend(value)
+
+    _, st, complete = results[-1]
+    output["logs"] = st.log = logs
+    st.si.Lfunc = _tabulate_Lfunc(constants["Lfunc"])
+    st.si.SparRange = SparRange
+    return output, st, complete
+
+
+def _bound_batch(si, st, bracket_step, batch_size):
+    """Take the next ``batch_size`` steps of the bounding loop in one
+    integration, with iterate_batch
+
+    The steps follow the same schedule as the one at a time loop in
+    `run_dls`. Candidates up to and including the first one where error1
+    changes sign are logged as if they had been iterated in turn, and st
+    is left at the last of them.
+
+    Returns
+    -------
+    bracket_step
+        Relative size of the next step, as after the last logged candidate
+    n_probes
+        Number of candidates logged
+    """
+    direction = -1 if st.error1 > 0 else 1
+    cvar = st.cvar
+    candidates = []
+    for _ in range(batch_size):
+        factor = 2 if bracket_step is None else 1 + bracket_step
+        cvar *= factor**direction
+        if bracket_step is not None:
+            bracket_step = 2 * bracket_step if bracket_step < 0.5 else None
+        candidates.append((cvar, bracket_step))
+
+    error1, qpllu1, Tucalc = iterate_batch(si, st, [c[0] for c in candidates])
+
+    # Stop at the first sign change, or take them all if there isn't one
+    flipped = np.sign(error1) != np.sign(st.error1)
+    n = int(np.argmax(flipped)) + 1 if flipped.any() else batch_size
+
+    for (cvar, _), *upstream in zip(candidates[:n], error1, qpllu1, Tucalc):
+        st.cvar = cvar
+        st.error1, st.qpllu1, st.Tucalc = upstream
+        st.update_log()
+
+    bracket_step = candidates[n - 1][1]
+    return bracket_step, n
+
+
+# How cvar scales with the analytic control parameter, which is
+# proportional to nu * sqrt(cz) / qpllu**(5/7)
+_ANALYTIC_EXPONENTS = {"impurity_frac": 2, "density": 1, "power": 7 / 5}
+
+
+def _analytic_profile(si):
+    """Analytic control parameter `CfInt_array` at each front position in
+    si.SparRange, and the upstream temperature it implies for a fixed heat
+    flux, both up to a constant factor
+
+    Returns
+    -------
+    array of shape (2, len(si.SparRange))
+    """
+    # Without an upstream grid, all the heat flux enters at the end
+    Sx = si.geometry.Sx if si.radios["upstreamGrid"] else si.S[-1]
+    Cf = CfInt_array(si.S, si.Btot, Sx, si.S[-1], si.SparRange)
+    # CfInt goes as B(front) / (Bx * Tu) for a given heat flux
+    return np.array([Cf, si.B(np.asarray(si.SparRange)) / Cf])
+
+
+def _analytic_guess(si, ratio, first_front, bracket_step=0.03):
+    """Estimate cvar and Tu at a front position by scaling the solution at
+    the first front position with the analytic profile
+
+    Parameters
+    ----------
+    ratio:
+        Analytic control parameter and upstream temperature relative to
+        those at the first front position
+    first_front:
+        Solved cvar and Tu at the first front position
+
+    Returns
+    -------
+    cvar, Tu, bracket_step
+    """
+    cvar_first, Tu_first = first_front
+    cvar = cvar_first * ratio[0] ** _ANALYTIC_EXPONENTS[si.control_variable]
+
+    # Tu also goes as the heat flux to the power 2/7
+    Tu = Tu_first * ratio[1]
+    if si.control_variable == "power":
+        Tu *= (cvar_first / cvar) ** (2 / 7)
+
+    return cvar, Tu, bracket_step
+
+
+def _extrapolate_solution(SparFront, converged, order=2):
+    """Estimate cvar and Tu at a front position by extrapolating the
+    solutions at previous front positions
+
+    Extrapolates log(cvar) and log(Tu) with a polynomial in SparFront
+    through the last ``order + 1`` solutions (fewer if not available).
+    The difference from the next lower order extrapolation is used as the
+    relative size of the first bracketing step for cvar.
+
+    Parameters
+    ----------
+    SparFront:
+        Front position to estimate the solution at
+    converged:
+        List of (SparFront, cvar, Tu) at previous front positions
+
+    Returns
+    -------
+    cvar, Tu, bracket_step
+    """
+    S, cvar, Tu = np.array(converged[-(order + 1) :]).T
+    log_y = np.log([cvar, Tu])
+
+    def extrapolate(n):
+        # Polynomial through the last n points
+        if n == 1 or len(np.unique(S[-n:])) < n:
+            return log_y[:, -1]
+        return np.array(
+            [np.polyval(np.polyfit(S[-n:], y[-n:], n - 1), SparFront) for y in log_y]
+        )
+
+    prediction = extrapolate(len(S))
+    if len(S) == 1:
+        bracket_step = 0.1
+    else:
+        bracket_step = abs(prediction[0] - extrapolate(len(S) - 1)[0])
+
+    cvar_guess, Tu_guess = np.exp(prediction)
+    return cvar_guess, Tu_guess, min(max(bracket_step, 1e-3), 0.5)
+
+
+def _solve_coupled(si, st, jacobian=None):
+    """Solve for cvar and Tu together using Broyden's method
+
+    Treats error1 (upstream heat flux) and error0 (upstream temperature)
+    as two residuals of log(cvar) and log(Tu), starting from st.cvar and
+    st.Tu. The initial Jacobian is either given, e.g. from the previous
+    front position, or estimated by finite differences.
+
+    Parameters
+    ----------
+    si : SimulationInputs
+        Simulation input object containing all constant parameters
+    st : SimulationState
+        Simulation state object, updated with the solution
+    jacobian : array, optional
+        Initial estimate of the 2x2 Jacobian
+
+    Returns
+    -------
+    converged : bool
+        True if both residuals are within Ctol and Ttol. If False, st
+        holds the best point found
+    jacobian : array
+        Final Jacobian estimate
+    """
+    tolerance = np.array([si.Ctol, si.Ttol])
+
+    evaluated = None  # Point st currently holds the profiles for
+
+    def residual(x):
+        nonlocal evaluated
+        evaluated = x
+        st.cvar, st.Tu = np.exp(x)
+        _iterate_cached(si, st)
+        st.error0 = (st.Tu - st.Tucalc) / st.Tu
+        return np.array([st.error1, st.error0])
+
+    def size(r):
+        return np.max(np.abs(r) / tolerance) if np.all(np.isfinite(r)) else np.inf
+
+    x = np.log([st.cvar, st.Tu])
+    r = residual(x)
+    best_size, best_x = size(r), x
+
+    if jacobian is None:
+        # Finite difference estimate
+        h = 1e-2
+        columns = []
+        for e in np.eye(2):
+            r_h = residual(x + h * e)
+            columns.append((r_h - r) / h)
+        jacobian = np.column_stack(columns)
+
+    for _ in range(si.timeout):
+        if size(r) < 1:
+            if not np.array_equal(evaluated, x):
+                # The finite difference points were evaluated after x, so
+                # st holds their profiles rather than those of the solution
+                residual(x)
+            return True, jacobian
+
+        try:
+            step = -np.linalg.solve(jacobian, r)
+        except np.linalg.LinAlgError:
+            break
+
+        # Don't let a poor Jacobian throw us miles away
+        step *= min(1, 0.5 / np.max(np.abs(step)))
+
+        r_new = residual(x + step)
+        if not np.all(np.isfinite(r_new)):
+            break
+
+        jacobian += np.outer(r_new - r - jacobian @ step, step) / (step @ step)
+        x, r = x + step, r_new
+        if size(r) < best_size:
+            best_size, best_x = size(r), x
+
+    st.cvar, st.Tu = np.exp(best_x)
+    return False, jacobian
+
+
+def _solve_bvp(si, st, previous):
+    """Solve for cvar and Tu at once as a boundary value problem with
+    `scipy.integrate.solve_bvp`
+
+    The Lengyel function is collocated on the nodes of st.s, with the
+    target conditions on q/B and T at one end and the upstream heat flux
+    and T = Tu at the other. log(cvar) and log(Tu) are the two unknown
+    parameters. The temperature is represented by T**(7/2), which unlike
+    T has a smooth derivative right up to the front. The radial heat
+    source switches on at the X-point, so the field line is split there
+    into segments which are each mapped onto [0, 1] and joined by
+    continuity conditions. For the same reason, the cooling curve is
+    interpolated linearly between fine samples, as the jumps between the
+    pieces of the fits (and between the cells of the table) would stop the
+    collocation residuals from converging.
+
+    The initial guess is the solution at a previous front position,
+    stretched onto st.s, with cvar and Tu from st. The solution is then
+    checked with a single iterate.
+
+    Parameters
+    ----------
+    previous : tuple
+        s, q/B and T at a previous front position (and its cvar and Tu,
+        which aren't used here)
+
+    Returns
+    -------
+    converged : bool
+        True if the check iterate is within Ctol and Ttol
+    """
+    s_prev, qoverB_prev, T_prev = previous[:3]
+    cvar0, Tu0 = st.cvar, st.Tu
+
+    # Scales of the unknowns, so that they're all of order one
+    qoverB_scale = si.qpllu0 / si.geometry.Bx
+    T72_scale = Tu0**3.5
+
+    # Segments of the field line, and whether each has the radial source
+    Sx = si.geometry.Sx
+    if si.radios["upstreamGrid"] and st.s[0] < Sx < st.s[-1]:
+        edges = [(st.s[0], Sx), (Sx, st.s[-1])]
+    else:
+        edges = [(st.s[0], st.s[-1])]
+    sources = [si.radios["upstreamGrid"] and lo >= Sx for lo, _ in edges]
+
+    Tcool = np.linspace(si.Tt / 10, si.Lz[0][-1], 10000)
+    Lcool = evaluate_Lfunc(si.Lfunc, Tcool)
+    dLdT = np.append(np.diff(Lcool) / np.diff(Tcool), 0)
+
+    # d log(nu**2 * cz) / d log(cvar) and d log(qradial) / d log(cvar)
+    radiation_power = {"impurity_frac": 1, "density": 2}.get(si.control_variable, 0)
+    source_power = -1 if si.control_variable == "power" else 0
+
+    def segments(t, y, p):
+        """Terms of the Lengyel function in each segment"""
+        cvar, Tu = np.exp(p) * [cvar0, Tu0]
+        cz, nu, qradial = control_parameters(si, cvar)
+        R = nu**2 * Tu**2 * cz
+        for j, ((lo, hi), source) in enumerate(zip(edges, sources)):
+            fieldValue = si.B(lo + t * (hi - lo))
+            T72 = y[2 * j + 1] * T72_scale
+            # Newton steps may overshoot to negative temperatures
+            floor = (si.Tt / 10) ** 3.5 > T72
+            T = np.where(floor, si.Tt / 10, np.abs(T72) ** (2 / 7))
+            # Radiation per unit nu**2 * Tu**2 * cz
+            radiation = np.interp(T, Tcool, Lcool) / T**2
+            source_term = qradial if source else 0
+            yield j, hi - lo, fieldValue, T, floor, radiation, R, source_term
+
+    def fun(t, y, p):
+        derivatives = []
+        for j, length, fieldValue, _, _, radiation, R, qradial in segments(t, y, p):
+            dqoverBds = (R * radiation - qradial) / fieldValue
+            dT72ds = 7 / 2 * y[2 * j] * qoverB_scale * fieldValue / si.kappa0
+            derivatives += [
+                dqoverBds * length / qoverB_scale,
+                dT72ds * length / T72_scale,
+            ]
+        return np.vstack(derivatives)
+
+    def fun_jac(t, y, p):
+        n = len(y)
+        df_dy = np.zeros((n, n, len(t)))
+        df_dp = np.zeros((n, 2, len(t)))
+        for j, length, fieldValue, T, floor, radiation, R, qradial in segments(t, y, p):
+            q, w = 2 * j, 2 * j + 1
+            scale = length / (fieldValue * qoverB_scale)
+            slope = dLdT[np.clip(np.searchsorted(Tcool, T) - 1, 0, len(Tcool) - 1)]
+            dradiation_dT = slope / T**2 - 2 * radiation / T
+            dT_dw = np.where(floor, 0, 2 / 7 * T / y[w])
+
+            df_dy[q, w] = R * dradiation_dT * dT_dw * scale
+            df_dy[w, q] = 7 / 2 * qoverB_scale * fieldValue / si.kappa0
+            df_dy[w, q] *= length / T72_scale
+            df_dp[q, 0] = radiation_power * R * radiation - source_power * qradial
+            df_dp[q, 0] *= scale
+            df_dp[q, 1] = 2 * R * radiation * scale
+        return df_dy, df_dp
+
+    qoverB_target = st.qpllt / si.B(st.s[0])
+    qoverB_upstream = 0 if si.radios["upstreamGrid"] else si.qpllu0 / si.B(st.s[-1])
+
+    def bc(ya, yb, p):
+        return np.array(
+            [
+                ya[0] - qoverB_target / qoverB_scale,
+                ya[1] - si.Tt**3.5 / T72_scale,
+                # Continuity between segments
+                *(yb[: len(ya) - 2] - ya[2:]),
+                yb[-2] - qoverB_upstream / qoverB_scale,
+                yb[-1] - np.exp(3.5 * p[1]),
+            ]
+        )
+
+    # Mesh from the nodes of st.s in each segment
+    t = np.unique(
+        np.concatenate(
+            [(st.s[(st.s >= lo) & (st.s <= hi)] - lo) / (hi - lo) for lo, hi in edges]
+            + [[0, 1]]
+        )
+    )
+
+    # Stretch the previous solution onto this front's field line
+    def stretched(profile, s):
+        x = (s - st.s[0]) / (st.s[-1] - st.s[0])
+        x_prev = (s_prev - s_prev[0]) / (s_prev[-1] - s_prev[0])
+        return np.interp(x, x_prev, profile)
+
+    y = []
+    for lo, hi in edges:
+        s = lo + t * (hi - lo)
+        y.extend(
+            (
+                stretched(qoverB_prev, s) / qoverB_scale,
+                (stretched(T_prev, s) / T_prev[-1]) ** 3.5,
+            )
+        )
+
+    with np.errstate(all="ignore"):
+        result = solve_bvp(
+            fun,
+            bc,
+            t,
+            np.vstack(y),
+            p=[0.0, 0.0],
+            fun_jac=fun_jac,
+            tol=si.Ctol,
+            max_nodes=5000,
+        )
+
+    if si.verbosity > 2:
+        print(f"\nsolve_bvp: {result.message}")
+
+    with np.errstate(over="ignore"):
+        cvar, Tu = np.exp(result.p) * [cvar0, Tu0]
+    if not (result.success and np.isfinite(cvar) and np.isfinite(Tu)):
+        return False
+
+    # Check the solution by shooting from it
+    st.cvar, st.Tu = cvar, Tu
+    _iterate_cached(si, st)
+    st.error0 = (st.Tu - st.Tucalc) / st.Tu
+    return abs(st.error1) < si.Ctol and abs(st.error0) < si.Ttol
@@ -8,7 +8,18 @@ except PackageNotFoundError:
     __version__ = get_version(root="..", relative_to=__file__)
 
 from .AnalyticCoolingCurves import LfuncN
+from .CoolingCurveTable import CoolingCurveTable
 from .DLScommonTools import file_read, file_write, make_arrays
-from .LRBv21 import run_dls
+from .LRBv21 import find_onset, run_dls, run_dls_adaptive, solve_front_position
 
-__all__ = ["LfuncN", "file_read", "file_write", "make_arrays", "run_dls"]
+__all__ = [
+    "CoolingCurveTable",
+    "LfuncN",
+    "file_read",
+    "file_write",
+    "find_onset",
+    "make_arrays",
+    "run_dls",
+    "run_dls_adaptive",
+    "solve_front_position",
+]
@@ -0,0 +1,159 @@
+"""
+Compiled kernel for `iterate`, used by ``run_dls(backend="numba")``.
+
+The Lengyel function, the field line spline and the cooling curve table
+are written here as plain functions of floats and arrays, which numba
+compiles together with the node to node Dormand-Prince integrator
+`Iterate.integrate_grid`.
+
+numba is optional, and can be installed with the ``numba`` extra. Without
+it, these functions run as ordinary (slow) Python, and `run_dls` uses the
+SciPy backend instead.
+"""
+
+import math
+
+import numpy as np
+
+from . import Iterate
+from .CoolingCurveTable import _SUB_CELLS, _SUB_RANGE, CoolingCurveTable
+from .Iterate import control_parameters, integrate_grid, store_solution
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+HAVE_NUMBA = njit is not None
+
+
+def _jit(function):
+    return njit(cache=True)(function) if HAVE_NUMBA else function
+
+
+@_jit
+def _field(s, S, coeffs):
+    """Cubic spline of B at s, clamped to the grid ends"""
+    n = len(S)
+    if s <= S[0]:
+        i, s = 0, S[0]
+    elif s >= S[n - 1]:
+        i, s = n - 2, S[n - 1]
+    else:
+        lo, hi = 0, n - 1
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            if S[mid] <= s:
+                lo = mid
+            else:
+                hi = mid
+        i = lo
+    ds = s - S[i]
+    return ((coeffs[i, 0] * ds + coeffs[i, 1]) * ds + coeffs[i, 2]) * ds + coeffs[i, 3]
+
+
+@_jit
+def _cooling(T, table):
+    """Cooling curve from a CoolingCurveTable's cells. NaN outside the table"""
+    x0, scale, Tmin, Tmax, log, coeffs, sub_index, sub_lower, sub_width, sub_coeffs = (
+        table
+    )
+    if not Tmin <= T < Tmax:
+        return math.nan
+    x = x0 + (math.log(T) if log else T) * scale
+    i = min(int(x), len(coeffs) - 1)
+    j = sub_index[i]
+    if j < 0:
+        t = x - i
+    else:
+        # Split cell, see CoolingCurveTable._sub_cell
+        distance = max(T - sub_lower[j], sub_width[j] * math.exp(-_SUB_RANGE))
+        v = (math.log(distance / sub_width[j]) + _SUB_RANGE) * (_SUB_CELLS / _SUB_RANGE)
+        k = min(int(v), _SUB_CELLS - 1)
+        t = v - k
+        coeffs = sub_coeffs
+        i = j * _SUB_CELLS + k
+    return coeffs[i, 0] + t * (coeffs[i, 1] + t * (coeffs[i, 2] + t * coeffs[i, 3]))
+
+
+@_jit
+def _lengfunc(s, qoverB, T, args):
+    """LengFunc, see Iterate.py"""
+    physics, S, Bcoeffs, table = args
+    radiation, qradial, kappa0, Sx, upstreamGrid = physics
+    # Before dividing by T, which raises ZeroDivisionError in numba
+    if not T > 0:
+        return math.nan, math.nan
+    fieldValue = _field(s, S, Bcoeffs)
+
+    dqoverBds = radiation / T**2 * _cooling(T, table) / fieldValue
+    if upstreamGrid and s > Sx:
+        dqoverBds -= qradial / fieldValue
+
+    return dqoverBds, qoverB * fieldValue / (kappa0 * T**2.5)
+
+
+# Inlined into integrate, so that fun is resolved when compiling rather than
+# passed as an object, which would stop numba caching the kernel
+_integrate_grid = (
+    njit(inline="always")(integrate_grid) if HAVE_NUMBA else integrate_grid
+)
+
+
+@_jit
+def integrate(args, s, qoverB0, T0, qoverB, T):
+    """`Iterate.integrate_grid` with `_lengfunc` as the right-hand side"""
+    return _integrate_grid(_lengfunc, args, s, qoverB0, T0, qoverB, T)
+
+
+def iterate(si, st):
+    """
+    Drop-in replacement for `Iterate.iterate` using the compiled kernel.
+
+    Falls back to `Iterate.iterate` for any call the kernel can't do, e.g.
+    if the temperature goes above the cooling curve table.
+    """
+    if not isinstance(si.Lfunc, CoolingCurveTable):
+        return Iterate.iterate(si, st)
+
+    st.cz, st.nu, st.qradial = control_parameters(si, st.cvar)
+
+    table = si.Lfunc
+    physics = (
+        float(st.nu**2 * st.Tu**2 * st.cz),
+        float(st.qradial),
+        float(si.kappa0),
+        float(si.geometry.Sx),
+        bool(si.radios["upstreamGrid"]),
+    )
+    cells = (
+        float(table._x0),
+        float(table._scale),
+        float(table.Tmin),
+        float(table.Tmax),
+        bool(table._log),
+        table.coeffs,
+        table.sub_index,
+        table.sub_lower,
+        table.sub_width,
+        table.sub_coeffs,
+    )
+
+    s = np.ascontiguousarray(st.s, dtype=float)
+    # Fresh arrays for each iterate, as in Iterate.iterate_grid
+    qoverB = np.empty(len(s))
+    T = np.empty(len(s))
+    status, s_end, _ = integrate(
+        (physics, si.B.S, si.B.coeffs, cells),
+        s,
+        st.qpllt / si.B(s[0]),
+        float(si.Tt),
+        qoverB,
+        T,
+    )
+
+    if status < 0:
+        return Iterate.iterate(si, st)
+
+    store_solution(si, st, qoverB, T, s_end if status == 1 else None)
+    return st
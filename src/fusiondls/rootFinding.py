@@ -0,0 +1,149 @@
+"""
+Bracketed root finders for the control variable (inner) loop.
+
+Each iteration of the inner loop is a full ODE solve, so rather than
+calling a function these are written as "propose a new point, then be told
+the error there" state machines. This lets `run_dls` keep control of the
+calls to `iterate` and of the logging.
+
+All of them start from a bracket ``[a, b]`` where the errors ``fa`` and
+``fb`` have opposite signs, and keep a bracket around the root.
+"""
+
+import math
+
+
+class Bisection:
+    """Plain bisection, halving the bracket each iteration"""
+
+    def __init__(self, a, fa, b, fb):
+        (self.lower, self.f_lower), (self.upper, self.f_upper) = sorted(
+            [(a, fa), (b, fb)]
+        )
+
+    def propose(self):
+        return self.lower + (self.upper - self.lower) / 2
+
+    def update(self, x, fx):
+        if math.copysign(1, fx) == math.copysign(1, self.f_lower):
+            self.lower, self.f_lower = x, fx
+        else:
+            self.upper, self.f_upper = x, fx
+
+
+class Brent:
+    """Brent's method: inverse quadratic and secant steps, falling back to
+    bisection whenever those aren't converging quickly enough
+
+    This follows the formulation of ``scipy.optimize.brentq``.
+
+    Parameters
+    ----------
+    rtol:
+        Relative size of the smallest step taken
+    """
+
+    def __init__(self, a, fa, b, fb, rtol=1e-10):
+        self.rtol = rtol
+        self.xpre, self.fpre = a, fa
+        self.xcur, self.fcur = b, fb
+        self.xblk, self.fblk = 0.0, 0.0
+        self.spre = self.scur = 0.0
+
+    def propose(self):
+        if self.fpre != 0 and self.fcur != 0 and (self.fpre < 0) != (self.fcur < 0):
+            self.xblk, self.fblk = self.xpre, self.fpre
+            self.spre = self.scur = self.xcur - self.xpre
+
+        if abs(self.fblk) < abs(self.fcur):
+            # Make xcur the best estimate so far
+            self.xpre, self.xcur, self.xblk = self.xcur, self.xblk, self.xcur
+            self.fpre, self.fcur, self.fblk = self.fcur, self.fblk, self.fcur
+
+        delta = self.rtol * abs(self.xcur) / 2
+        sbis = (self.xblk - self.xcur) / 2
+
+        if abs(self.spre) > delta and abs(self.fcur) < abs(self.fpre):
+            if self.xpre == self.xblk:
+                # Secant
+                stry = -self.fcur * (self.xcur - self.xpre) / (self.fcur - self.fpre)
+            else:
+                # Inverse quadratic interpolation
+                dpre = (self.fpre - self.fcur) / (self.xpre - self.xcur)
+                dblk = (self.fblk - self.fcur) / (self.xblk - self.xcur)
+                stry = (
+                    -self.fcur
+                    * (self.fblk * dblk - self.fpre * dpre)
+                    / (dblk * dpre * (self.fblk - self.fpre))
+                )
+
+            if 2 * abs(stry) < min(abs(self.spre), 3 * abs(sbis) - delta):
+                # Accept the interpolated step
+                self.spre, self.scur = self.scur, stry
+            else:
+                self.spre = self.scur = sbis
+        else:
+            self.spre = self.scur = sbis
+
+        self.xpre, self.fpre = self.xcur, self.fcur
+        if abs(self.scur) > delta:
+            self.xcur += self.scur
+        else:
+            self.xcur += math.copysign(delta, sbis)
+
+        return self.xcur
+
+    def update(self, x, fx):
+        self.xcur, self.fcur = x, fx
+
+
+class ITP:
+    """Interpolate, truncate and project (Oliveira and Takahashi, 2020)
+
+    Regula falsi steps nudged towards the midpoint and kept within a
+    shrinking distance of it, so that it never needs more than ``n0`` more
+    iterations than bisection, but usually converges superlinearly.
+
+    Parameters
+    ----------
+    rtol:
+        Relative bracket width which the worst case iteration count is
+        guaranteed for
+    k1, k2, n0:
+        Tuning parameters, see the paper. ``n0 = 2`` rather than the usual
+        1 leaves room for a few slow one-sided regula falsi steps from the
+        wide brackets that doubling/halving produces
+    """
+
+    def __init__(self, a, fa, b, fb, rtol=1e-8, k1=0.2, k2=2, n0=2):
+        (self.a, self.fa), (self.b, self.fb) = sorted([(a, fa), (b, fb)])
+        width = self.b - self.a
+        self.eps = rtol * max(abs(self.a), abs(self.b))
+        self.k1 = k1 / width
+        self.k2 = k2
+        self.n_max = math.ceil(math.log2(width / (2 * self.eps))) + n0
+        self.j = 0
+
+    def propose(self):
+        a, b, fa, fb = self.a, self.b, self.fa, self.fb
+        x_half = (a + b) / 2
+        r = max(self.eps * 2 ** (self.n_max - self.j) - (b - a) / 2, 0)
+        delta = self.k1 * (b - a) ** self.k2
+        self.j += 1
+
+        # Interpolate
+        x_f = (b * fa - a * fb) / (fa - fb)
+        # Truncate
+        sigma = math.copysign(1, x_half - x_f)
+        x_t = x_f + sigma * delta if delta <= abs(x_half - x_f) else x_half
+        # Project
+        return x_t if abs(x_t - x_half) <= r else x_half - sigma * r
+
+    def update(self, x, fx):
+        if math.copysign(1, fx) == math.copysign(1, self.fa):
+            self.a, self.fa = x, fx
+        else:
+            self.b, self.fb = x, fx
+
+
+ROOT_FINDERS = {"bisect": Bisection, "brent": Brent, "itp": ITP}
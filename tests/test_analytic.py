@@ -3,15 +3,19 @@ import pathlib
 import numpy as np
 
 from fusiondls import LfuncN, file_read, run_dls
-from fusiondls.Analytic_DLS import CfInt
+from fusiondls.Analytic_DLS import CfInt, CfInt_array
+from fusiondls.AnalyticCoolingCurves import LfuncKallenbachAr
 
 
-def test_analytic():
+def geometry():
     filename = (
         pathlib.Path(__file__).parent.parent / "docs/examples/eqb_store_lores.pkl"
     )
-    eqb = file_read(filename)
-    d = eqb["V10"]["ou"]
+    return file_read(filename)["V10"]["ou"]
+
+
+def test_analytic():
+    d = geometry()
 
     radios = {"ionisation": False, "upstreamGrid": True}
     constants = {
@@ -40,3 +44,21 @@ def test_analytic():
 
     # RMS error should only be a few percent
     assert l2_error < 0.05
+
+
+def test_CfInt_array():
+    d = geometry()
+    s_parallel = np.linspace(0, d["S"][d["Xpoint"] - 1], 30)
+
+    expected = [
+        CfInt(d["S"], d["Btot"], d["Sx"], np.max(d["S"]), s) for s in s_parallel
+    ]
+    result = CfInt_array(d["S"], d["Btot"], d["Sx"], np.max(d["S"]), s_parallel)
+    np.testing.assert_allclose(result, expected, rtol=1e-5)
+
+    # Only the constant factor depends on the cooling curve
+    argon = CfInt_array(
+        d["S"], d["Btot"], d["Sx"], np.max(d["S"]), s_parallel, LfuncKallenbachAr
+    )
+    np.testing.assert_allclose(argon / argon[0], result / result[0], rtol=1e-12)
+    assert argon[0] != result[0]
@@ -0,0 +1,121 @@
+import numpy as np
+import pytest
+
+from fusiondls import AnalyticCoolingCurves, CoolingCurveTable
+from fusiondls.AnalyticCoolingCurves import LfuncKallenbach, evaluate_Lfunc
+from fusiondls.CoolingCurveTable import (
+    cooling_curve_integral,
+    cooling_curve_table,
+    lfunc_derivative,
+)
+
+CURVES = [
+    "LfuncN",
+    "LfuncNe",
+    "LfuncAr",
+    "LfuncKallenbachN",
+    "LfuncKallenbachAr",
+    "LfuncKallenbachAr100B",
+    "LfuncKallenbachAr200",
+    "LfuncKallenbachAr100",
+    "LfuncKallenbachAr150",
+    "LfuncKallenbachNe",
+]
+
+
+@pytest.mark.parametrize("name", CURVES)
+def test_array_matches_scalar(name):
+    Lfunc = getattr(AnalyticCoolingCurves, name)
+    # Include the piece boundaries, which are easy to get wrong
+    T = np.concatenate(
+        [np.linspace(-1, 350, 2001), [1, 1.5, 2, 3, 5, 40, 80, 100, 150, 200, 300]]
+    )
+
+    scalar = np.array([Lfunc(t) for t in T])
+    array = Lfunc(T)
+
+    assert array.shape == T.shape
+    np.testing.assert_allclose(array, scalar, rtol=1e-14, atol=0)
+
+
+def test_evaluate_Lfunc_scalar_only():
+    def Lfunc(T):
+        if T > 5:
+            return 1e-31
+        return 0
+
+    T = np.linspace(0, 10, 11)
+    np.testing.assert_array_equal(evaluate_Lfunc(Lfunc, T), np.where(T > 5, 1e-31, 0))
+
+
+@pytest.mark.parametrize("spacing", ["linear", "log"])
+def test_cooling_curve_table(spacing):
+    Lfunc = LfuncKallenbach("Ar")
+    table = CoolingCurveTable(Lfunc, Tmin=0.1, Tmax=300, n=5000, spacing=spacing)
+
+    assert table.max_error_vs_peak < 1e-5
+
+    T = np.geomspace(0.01, 1000, 501)
+    expected = Lfunc(T)
+    np.testing.assert_allclose(table(T), expected, rtol=0, atol=1e-5 * expected.max())
+    np.testing.assert_allclose([table(t) for t in T], table(T), rtol=1e-12)
+
+    # Outside the table we fall back to the original function
+    assert table(0.05) == Lfunc(0.05)
+    assert table(500.0) == Lfunc(500.0)
+
+
+def test_cooling_curve_table_discontinuity():
+    """Jumps on a grid node shouldn't leak into the neighbouring cells"""
+    table = CoolingCurveTable(AnalyticCoolingCurves.LfuncKallenbachN, n=5000)
+    assert table.max_error_vs_peak < 1e-4
+    assert not table(0.99)
+
+
+def test_cooling_curve_table_onset():
+    """The sqrt(T - 1) onset of LfuncN is resolved by splitting cells"""
+    Lfunc = AnalyticCoolingCurves.LfuncN
+    table = CoolingCurveTable(Lfunc)
+    assert len(table.sub_lower)
+    assert table.max_relative_error < 1e-4
+
+    T = 1 + np.geomspace(1e-10, 1, 101)
+    np.testing.assert_allclose(table(T), Lfunc(T), rtol=1e-4)
+    np.testing.assert_allclose([table(t) for t in T], table(T), rtol=1e-12)
+
+    # Where a central difference is still accurate
+    T = T[T > 1 + 1e-6]
+    np.testing.assert_allclose(
+        [table.derivative(t) for t in T],
+        [lfunc_derivative(Lfunc, t, dT=(t - 1) * 1e-4) for t in T],
+        rtol=1e-3,
+    )
+
+
+def test_cooling_curve_cache():
+    Lfunc = LfuncKallenbach("Ne")
+
+    assert cooling_curve_table(Lfunc) is cooling_curve_table(Lfunc)
+    assert cooling_curve_table(Lfunc) is not cooling_curve_table(Lfunc, n=100)
+
+    Lz, integralinterp = cooling_curve_integral(Lfunc)
+    assert cooling_curve_integral(Lfunc)[1] is integralinterp
+    with pytest.raises(ValueError, match="read-only"):
+        Lz[1][0] = 1.0
+
+
+@pytest.mark.parametrize("spacing", ["linear", "log"])
+def test_cooling_curve_table_derivative(spacing):
+    Lfunc = LfuncKallenbach("Ar")
+    table = CoolingCurveTable(Lfunc, Tmin=0.1, Tmax=300, n=5000, spacing=spacing)
+
+    # Away from the joins between the pieces of the fit
+    T = np.array([1.5, 3.0, 10.0, 25.0, 90.0, 200.0])
+    expected = [lfunc_derivative(Lfunc, t) for t in T]
+    np.testing.assert_allclose(
+        [table.derivative(t) for t in T],
+        expected,
+        rtol=0,
+        atol=1e-4 * np.max(np.abs(expected)),
+    )
+    assert lfunc_derivative(table, 10.0) == table.derivative(10.0)
@@ -0,0 +1,28 @@
+import pathlib
+
+import numpy as np
+from scipy import interpolate
+
+from fusiondls import file_read
+from fusiondls.FieldInterpolator import FieldInterpolator
+
+
+def test_matches_interp1d():
+    filename = (
+        pathlib.Path(__file__).parent.parent / "docs/examples/eqb_store_lores.pkl"
+    )
+    d = file_read(filename)["V10"]["ou"]
+
+    expected = interpolate.interp1d(d["S"], d["Btot"], kind="cubic")
+    B = FieldInterpolator(d["S"], d["Btot"])
+
+    s = np.linspace(d["S"][0], d["S"][-1], 2001)
+    np.testing.assert_allclose(B(s), expected(s), rtol=1e-12)
+
+    # Scalar path, both sweeping along the field line and jumping around
+    np.testing.assert_allclose([B(x) for x in s], expected(s), rtol=1e-12)
+    np.testing.assert_allclose([B(x) for x in s[::-37]], expected(s[::-37]), rtol=1e-12)
+
+    # Clamped outside the grid
+    assert B(d["S"][0] - 1.0) == B(d["S"][0])
+    np.testing.assert_array_equal(B([d["S"][-1] + 1.0]), [B(d["S"][-1])])
@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+from fusiondls.rootFinding import ROOT_FINDERS
+
+
+def solve(method, f, a, b, tol=1e-10, maxiter=100):
+    root_finder = ROOT_FINDERS[method](a, f(a), b, f(b))
+    for i in range(maxiter):
+        x = root_finder.propose()
+        fx = f(x)
+        root_finder.update(x, fx)
+        if abs(fx) < tol:
+            return x, i + 1
+    raise RuntimeError(f"{method} did not converge")
+
+
+@pytest.mark.parametrize("method", ROOT_FINDERS)
+@pytest.mark.parametrize("sign", [1, -1])
+def test_root_finders(method, sign):
+    # Smooth and monotone like error1(cvar), and either way up
+    def f(x):
+        return sign * (np.log(x) + 0.3 * (x - 1.0)) - 0.2
+
+    x, iterations = solve(method, f, 0.1, 20.0)
+    assert abs(f(x)) < 1e-10
+
+    if method != "bisect":
+        assert iterations < solve("bisect", f, 0.1, 20.0)[1] / 2
@@ -0,0 +1,525 @@
+import multiprocessing
+import pathlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from fusiondls import (
+    CoolingCurveTable,
+    LRBv21,
+    file_read,
+    find_onset,
+    numbaBackend,
+    run_dls,
+    run_dls_adaptive,
+    solve_front_position,
+)
+from fusiondls.AnalyticCoolingCurves import LfuncKallenbachAr, LfuncN
+from fusiondls.Iterate import LengFunc, LengFuncJacobian, control_parameters
+
+# The analytic Jacobian is checked against the simulation inputs directly
+from fusiondls.LRBv21 import SimulationState, _simulation_inputs  # noqa: PLC2701
+
+
+@pytest.fixture(scope="module")
+def geometry():
+    filename = (
+        pathlib.Path(__file__).parent.parent / "docs/examples/eqb_store_lores.pkl"
+    )
+    return file_read(filename)["V10"]["ou"]
+
+
+@pytest.fixture
+def constants():
+    return {
+        "gamma_sheath": 7,
+        "Tt": 1,
+        "qpllu0": 4e8,
+        "nu0": 1e20,
+        "cz0": 0.02,
+        "Lfunc": LfuncKallenbachAr,
+    }
+
+
+RADIOS = {"ionisation": False, "upstreamGrid": True}
+
+
+@pytest.mark.parametrize("control_variable", ["impurity_frac", "density", "power"])
+def test_warm_start(geometry, constants, control_variable):
+    SparRange = np.linspace(0, geometry["S"][geometry["Xpoint"] - 1], 10)
+
+    cold = run_dls(constants, RADIOS, geometry, SparRange, control_variable, Ttol=1e-3)
+    warm = run_dls(
+        constants,
+        RADIOS,
+        geometry,
+        SparRange,
+        control_variable,
+        Ttol=1e-3,
+        warm_start=True,
+    )
+
+    # Both are only converged to Ttol, which allows a few percent in cvar
+    np.testing.assert_allclose(warm["cvar"], cold["cvar"], rtol=5e-2)
+
+    # Each front position has its own log
+    assert len(warm["logs"]) == len(SparRange)
+    calls = [len(log["cvar"]) for log in warm["logs"].values()]
+    cold_calls = [len(log["cvar"]) for log in cold["logs"].values()]
+    assert sum(calls) < sum(cold_calls)
+
+
+@pytest.mark.parametrize("root_method", ["brent", "itp"])
+def test_root_method(geometry, constants, root_method):
+    SparRange = np.linspace(0, geometry["S"][geometry["Xpoint"] - 1], 5)
+
+    bisect = run_dls(constants, RADIOS, geometry, SparRange)
+    result = run_dls(constants, RADIOS, geometry, SparRange, root_method=root_method)
+
+    np.testing.assert_allclose(result["cvar"], bisect["cvar"], rtol=5e-2)
+    assert "lower_bound" in result["logs"][SparRange[-1]]
+
+
+@pytest.mark.parametrize("control_variable", ["impurity_frac", "density", "power"])
+def test_analytic_start(geometry, constants, control_variable):
+    SparRange = np.linspace(0, geometry["S"][geometry["Xpoint"] - 1], 10)
+
+    cold = run_dls(constants, RADIOS, geometry, SparRange, control_variable)
+    analytic = run_dls(
+        constants, RADIOS, geometry, SparRange, control_variable, analytic_start=True
+    )
+
+    np.testing.assert_allclose(analytic["cvar"], cold["cvar"], rtol=5e-2)
+
+    # The first front is a cold start
+    calls = [len(log["cvar"]) for log in analytic["logs"].values()]
+    cold_calls = [len(log["cvar"]) for log in cold["logs"].values()]
+    assert calls[0] == cold_calls[0]
+    assert sum(calls) < sum(cold_calls)
+
+
+def test_combined_control_variables(geometry, constants, capsys, monkeypatch):
+    SparRange = np.linspace(0, geometry["S"][geometry["Xpoint"] - 1], 5)
+
+    result = run_dls(
+        constants, RADIOS, geometry, SparRange, ["impurity_frac", "density"]
+    )
+    assert "qpllt is set from nu0" in capsys.readouterr().out
+
+    impurity = run_dls(constants, RADIOS, geometry, SparRange, "impurity_frac")
+    np.testing.assert_array_equal(result["impurity_frac"]["cvar"], impurity["cvar"])
+    assert np.all(result["impurity_frac"]["qpllt_mismatch"] == 0)
+
+    density = run_dls(constants, RADIOS, geometry, SparRange, "density")
+    np.testing.assert_allclose(result["density"]["cvar"], density["cvar"], rtol=5e-2)
+    np.testing.assert_allclose(
+        result["density"]["qpllt_mismatch"],
+        result["density"]["cvar"] / constants["nu0"] - 1,
+    )
+    assert result["density"]["threshold"] == result["density"]["cvar"][0]
+
+    # A small mismatch is reported, but doesn't change the solution enough
+    # to warn about
+    result = run_dls({**constants, "nu0": 3.6e19}, RADIOS, geometry, [0.0], ["density"])
+    assert 0 < abs(result["density"]["qpllt_mismatch"][0]) < 0.1
+    assert "qpllt is set from nu0" not in capsys.readouterr().out
+
+    # The impurity fraction is solved with nu0, so there is nothing to check
+    monkeypatch.setattr(LRBv21, "_qpllt_sensitivity", None)
+    result = run_dls(constants, RADIOS, geometry, [1.0], ["impurity_frac"])
+    assert result["impurity_frac"]["qpllt_mismatch"] == [0]
+
+    # The target heat flux doesn't depend on nu0 with zero_qpllt
+    result = run_dls(constants, RADIOS, geometry, [1.0], ["density"], zero_qpllt=True)
+    assert result["density"]["qpllt_mismatch"] == [0]
+    assert "qpllt is set from nu0" not in capsys.readouterr().out
+
+    with pytest.raises(ValueError, match="power"):
+        run_dls(constants, RADIOS, geometry, SparRange, ["density", "power"])
+
+
+def test_outputs_scalars(geometry, constants):
+    SparRange = np.linspace(0, geometry["S"][geometry["Xpoint"] - 1], 5)
+
+    full = run_dls(constants, RADIOS, geometry, SparRange[[0, -1]])
+    # Only the first and last front positions are needed
+    result = run_dls(constants, RADIOS, geometry, SparRange, outputs="scalars")
+
+    assert result.keys() == {"threshold", "window", "window_frac", "window_ratio"}
+    for key, value in result.items():
+        assert value == full[key], key
+
+    combined = run_dls(
+        constants,
+        RADIOS,
+        geometry,
+        SparRange,
+        ["impurity_frac", "density"],
+        outputs="scalars",
+    )
+    assert combined["impurity_frac"] == result
+    assert combined["density"].keys() == result.keys()
+
+    with pytest.raises(ValueError, match="outputs"):
+        run_dls(constants, RADIOS, geometry, SparRange, outputs="profiles")
+
+
+def test_run_dls_adaptive(geometry, constants):
+    result = run_dls_adaptive(constants, RADIOS, geometry, tol=5e-3, n_initial=3)
+
+    SparRange = list(result["logs"])
+    assert 3 < len(SparRange) <= 50
+    assert SparRange == sorted(SparRange)
+    assert np.all(np.diff(result["splot"]) > 0)
+
+    # Each front is solved independently, as in a single run
+    expected = run_dls(constants, RADIOS, geometry, SparRange)
+    np.testing.assert_array_equal(result["cvar"], expected["cvar"])
+    np.testing.assert_array_equal(result["crel"], expected["crel"])
+    assert result["window_ratio"] == expected["window_ratio"]
+
+    result = run_dls_adaptive(
+        constants, RADIOS, geometry, tol=1e-4, n_initial=3, max_fronts=6
+    )
+    assert len(result["cvar"]) == 6
+
+    with pytest.raises(ValueError, match="outputs"):
+        run_dls_adaptive(constants, RADIOS, geometry, outputs="scalars")
+    with pytest.raises(ValueError, match="control_variable"):
+        run_dls_adaptive(
+            constants, RADIOS, geometry, control_variable=["impurity_frac", "density"]
+        )
+
+
+def test_find_onset(geometry, constants, capsys):
+    filename = pathlib.Path(__file__).parent.parent / "docs/examples/eqb_store.pkl"
+    inner = file_read(filename)["SPR38"]["iu"]
+    # crel is close to 1 either side of the onset, so this needs to be
+    # well converged to compare with a scan
+    tolerances = {"Ttol": 1e-4, "Ctol": 1e-5, "root_method": "brent"}
+    result = find_onset(constants, RADIOS, inner, **tolerances)
+
+    # Bracketed down to neighbouring grid points, in far fewer solves than
+    # there are grid points below the X-point
+    assert len(result["cvar"]) < 10 < inner["Xpoint"]
+    upper = np.searchsorted(result["Splot"], result["spar_onset"])
+    assert result["crel"][upper - 1] < 1 <= result["crel"][upper]
+    points = np.searchsorted(inner["S"], result["Splot"][upper - 1 : upper + 1])
+    assert np.diff(points) == 1
+
+    # Same as interpolating a scan over the bracket
+    scan = run_dls(constants, RADIOS, inner, [0, *inner["S"][points]], **tolerances)
+    expected = np.interp(1, scan["crel"][1:], scan["splot"][1:])
+    assert np.isclose(result["spar_onset"], expected, rtol=1e-3)
+
+    # More power holds the front nearer the target, so crel comes back down
+    power = find_onset(constants, RADIOS, inner, control_variable="power")
+    upper = np.searchsorted(power["Splot"], power["spar_onset"])
+    assert power["crel"][upper - 1] > 1 >= power["crel"][upper]
+
+    # The outer divertor is stable all the way from the target
+    assert find_onset(constants, RADIOS, geometry)["spar_onset"] == 0
+
+    assert np.isnan(find_onset(constants, RADIOS, geometry, crel=100)["spar_onset"])
+    assert "WARNING: crel doesn't cross 100" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("control_variable", ["impurity_frac", "power"])
+def test_solve_front_position(geometry, constants, control_variable, capsys):
+    SparRange = np.linspace(0, geometry["S"][geometry["Xpoint"] - 1], 5)
+    curve = run_dls(constants, RADIOS, geometry, SparRange, control_variable)
+    cvar_value = np.mean(curve["cvar"][2:4])
+
+    result = solve_front_position(
+        constants, RADIOS, geometry, cvar_value, control_variable, curve=curve
+    )
+    # Bracketed by neighbouring grid points, starting from the curve
+    assert len(result["cvar"]) <= 3
+    i = np.searchsorted(result["Splot"], result["SparFront"])
+    points = np.searchsorted(geometry["S"], result["Splot"][i - 1 : i + 1])
+    assert np.diff(points) == 1
+    cvar = sorted(result["cvar"][i - 1 : i + 1])
+    assert cvar[0] < cvar_value <= cvar[1]
+    assert result["index"] in {i - 1, i}
+    assert len(result["Tprofiles"][result["index"]]) == len(geometry["S"])
+
+    # Without a curve, the front is bracketed from scratch
+    cold = solve_front_position(
+        constants, RADIOS, geometry, cvar_value, control_variable
+    )
+    assert len(cold["cvar"]) > len(result["cvar"])
+    spacing = np.diff(geometry["S"][points])
+    assert abs(cold["SparFront"] - result["SparFront"]) < spacing
+
+    # Below the threshold the front stays at the target
+    below, above = (0.5, 2) if control_variable != "power" else (2, 0.5)
+    result = solve_front_position(
+        constants,
+        RADIOS,
+        geometry,
+        curve["cvar"][0] * below,
+        control_variable,
+        curve=curve,
+    )
+    assert result["SparFront"] == 0
+
+    result = solve_front_position(
+        constants,
+        RADIOS,
+        geometry,
+        curve["cvar"][-1] * above,
+        control_variable,
+        curve=curve,
+    )
+    assert np.isnan(result["SparFront"])
+    assert "WARNING: the front is past SparMax" in capsys.readouterr().out
+
+
+def test_root_method_unknown(geometry, constants):
+    with pytest.raises(ValueError, match="root_method"):
+        run_dls(constants, RADIOS, geometry, [0.0], root_method="newton")
+
+
+@pytest.mark.parametrize("control_variable", ["impurity_frac", "power"])
+def test_solve_mode_broyden(geometry, constants, control_variable):
+    SparRange = np.linspace(0, geometry["S"][geometry["Xpoint"] - 1], 5)
+
+    nested = run_dls(constants, RADIOS, geometry, SparRange, control_variable)
+    result = run_dls(
+        constants,
+        RADIOS,
+        geometry,
+        SparRange,
+        control_variable,
+        solve_mode="broyden",
+        warm_start=True,
+    )
+
+    np.testing.assert_allclose(result["cvar"], nested["cvar"], rtol=5e-2)
+
+    # Both residuals are converged together
+    for log in result["logs"].values():
+        assert abs(log["error1"][-1]) < 1e-3
+        assert abs(log["error0"][-1]) < 1e-2
+
+
+@pytest.mark.parametrize("control_variable", ["impurity_frac", "density", "power"])
+def test_solve_mode_bvp(geometry, constants, control_variable):
+    SparRange = np.linspace(0, geometry["S"][geometry["Xpoint"] - 1], 5)
+
+    nested = run_dls(constants, RADIOS, geometry, SparRange, control_variable)
+    result = run_dls(
+        constants, RADIOS, geometry, SparRange, control_variable, solve_mode="bvp"
+    )
+
+    np.testing.assert_allclose(result["cvar"], nested["cvar"], rtol=5e-2)
+
+    # Fronts after the first are solved by a single BVP solve and check
+    # iterate, unless that falls back to the nested loops
+    calls = [len(log["cvar"]) for log in result["logs"].values()]
+    nested_calls = [len(log["cvar"]) for log in nested["logs"].values()]
+    assert sum(calls[1:]) < sum(nested_calls[1:]) / 2
+
+
+def assert_same_output(result, expected):
+    assert result.keys() == expected.keys()
+    for key in expected.keys() - {"state", "constants"}:
+        np.testing.assert_equal(result[key], expected[key], err_msg=key)
+
+
+def test_n_workers(geometry, constants):
+    SparRange = np.linspace(0, geometry["S"][geometry["Xpoint"] - 1], 4)
+
+    serial = run_dls(constants, RADIOS, geometry, SparRange)
+    parallel = run_dls(constants, RADIOS, geometry, SparRange, n_workers=2)
+
+    assert_same_output(parallel, serial)
+    assert list(parallel["logs"]) == list(SparRange)
+
+
+def test_n_workers_closure(geometry, constants):
+    """Cooling curves that can't be pickled are sent by forking"""
+    if "fork" not in multiprocessing.get_all_start_methods():
+        pytest.skip("needs fork")
+
+    # Wrapped in a lambda on purpose, so that it can't be pickled
+    constants["Lfunc"] = lambda T: LfuncKallenbachAr(T)  # noqa: PLW0108
+    SparRange = np.linspace(0, geometry["S"][geometry["Xpoint"] - 1], 3)
+
+    serial = run_dls(constants, RADIOS, geometry, SparRange)
+    parallel = run_dls(constants, RADIOS, geometry, SparRange, n_workers=2)
+
+    assert_same_output(parallel, serial)
+
+
+def test_executor_warm_start(geometry, constants):
+    SparRange = np.linspace(0, geometry["S"][geometry["Xpoint"] - 1], 6)
+
+    # One block is the same as the serial warm start
+    serial = run_dls(constants, RADIOS, geometry, SparRange, warm_start=True)
+    with ThreadPoolExecutor(2) as executor:
+        parallel = run_dls(
+            constants,
+            RADIOS,
+            geometry,
+            SparRange,
+            warm_start=True,
+            executor=executor,
+            n_workers=1,
+        )
+    assert_same_output(parallel, serial)
+
+
+@pytest.mark.parametrize(
+    "options",
+    [{"warm_start": True}, {"analytic_start": True}, {"solve_mode": "bvp"}],
+)
+def test_n_workers_previous_front(geometry, constants, options):
+    """Each block starts from its own previous fronts"""
+    SparRange = np.linspace(0, geometry["S"][geometry["Xpoint"] - 1], 6)
+    tol = 1e-4
+    options = {**options, "Ctol": tol, "Ttol": tol}
+
+    serial = run_dls(constants, RADIOS, geometry, SparRange, **options)
+    with ThreadPoolExecutor(2) as executor:
+        parallel = run_dls(
+            constants,
+            RADIOS,
+            geometry,
+            SparRange,
+            executor=executor,
+            n_workers=2,
+            **options,
+        )
+
+    # Ttol bounds the change in Tu between iterations, so the solutions from
+    # different starts differ by a few times it
+    np.testing.assert_allclose(parallel["cvar"], serial["cvar"], rtol=10 * tol)
+    # The first block is solved as in turn, previous fronts and all
+    np.testing.assert_allclose(parallel["cvar"][:3], serial["cvar"][:3], rtol=1e-9)
+
+
+def test_bracket_batch(geometry, constants):
+    SparRange = np.linspace(0, geometry["S"][geometry["Xpoint"] - 1], 5)
+
+    serial = run_dls(constants, RADIOS, geometry, SparRange)
+    batch = run_dls(constants, RADIOS, geometry, SparRange, bracket_batch=4)
+
+    np.testing.assert_allclose(batch["cvar"], serial["cvar"], rtol=5e-2)
+
+    # Bracketing probes are logged as if they had been solved one at a time
+    for log in batch["logs"].values():
+        assert len(log["cvar"]) == len(log["error1"]) == len(log["upper_bound"])
+
+
+def test_iterate_cache(geometry, constants):
+    # Two front positions on the same grid point
+    SparRange = [geometry["S"][5], geometry["S"][5] + 1e-6]
+
+    result = run_dls(constants, RADIOS, geometry, SparRange)
+
+    assert result["cvar"][1] == result["cvar"][0]
+    assert result["cache_hits"][1] == result["cache_lookups"][1] > 0
+    assert 0.5 <= result["cache_hit_rate"] < 1
+
+
+def test_iterate_cache_bounded(geometry, constants):
+    SparRange = [geometry["S"][5], geometry["S"][10]]
+
+    st = run_dls(constants, RADIOS, geometry, SparRange)["state"]
+
+    # Only the iterates at the last front position are kept
+    assert st.cache_point == 10
+    assert 0 < len(st.cache) <= len(st.log[SparRange[-1]]["cvar"])
+
+
+@pytest.mark.parametrize("backend", ["grid", "numba", "temperature"])
+def test_backend(geometry, constants, monkeypatch, backend):
+    # The numba kernel is run as plain Python if numba isn't installed
+    monkeypatch.setattr(numbaBackend, "HAVE_NUMBA", True)
+    SparRange = np.linspace(0, geometry["S"][geometry["Xpoint"] - 1], 3)
+
+    scipy = run_dls(constants, RADIOS, geometry, SparRange)
+    kernel = run_dls(constants, RADIOS, geometry, SparRange, backend=backend)
+
+    np.testing.assert_allclose(kernel["cvar"], scipy["cvar"], rtol=1e-2)
+    for T, T_scipy in zip(kernel["Tprofiles"], scipy["Tprofiles"]):
+        np.testing.assert_allclose(T, T_scipy, rtol=1e-2)
+
+
+def test_backend_numba_compiled(geometry, constants):
+    pytest.importorskip("numba")
+    SparRange = np.linspace(0, geometry["S"][geometry["Xpoint"] - 1], 3)
+
+    scipy = run_dls(constants, RADIOS, geometry, SparRange)
+    result = run_dls(constants, RADIOS, geometry, SparRange, backend="numba")
+
+    # The kernel was compiled, rather than run as plain Python
+    assert numbaBackend.integrate.signatures
+    np.testing.assert_allclose(result["cvar"], scipy["cvar"], rtol=1e-2)
+
+
+def test_backend_numba_zero_temperature():
+    # NaN rather than ZeroDivisionError, which numba raises too, so that
+    # the step is rejected as with the other backends
+    physics = (1.0, 0.0, 2500.0, 0.0, False)
+    cells = (0.0, 1.0, 0.1, 10.0, False, np.zeros((1, 4)), np.full(1, -1))
+    cells += (np.zeros(0), np.zeros(0), np.zeros((0, 4)))
+    args = (physics, np.array([0.0, 1.0]), np.ones((1, 4)), cells)
+    assert np.isnan(numbaBackend._lengfunc(0.5, 1.0, 0.0, args)).all()
+
+
+def test_backend_numba_missing(geometry, constants, monkeypatch, capsys):
+    monkeypatch.setattr(numbaBackend, "HAVE_NUMBA", False)
+    SparRange = np.linspace(0, geometry["S"][geometry["Xpoint"] - 1], 3)
+
+    scipy = run_dls(constants, RADIOS, geometry, SparRange)
+    result = run_dls(constants, RADIOS, geometry, SparRange, backend="numba")
+
+    assert "numba is not installed" in capsys.readouterr().out
+    assert_same_output(result, scipy)
+
+
+def test_backend_unknown(geometry, constants):
+    with pytest.raises(ValueError, match="backend"):
+        run_dls(constants, RADIOS, geometry, [0.0], backend="fortran")
+
+
+@pytest.mark.parametrize("ode_method", ["Radau", "LSODA"])
+def test_ode_method(geometry, constants, ode_method):
+    SparRange = np.linspace(0, geometry["S"][geometry["Xpoint"] - 1], 2)
+
+    rk45 = run_dls(constants, RADIOS, geometry, SparRange)
+    result = run_dls(constants, RADIOS, geometry, SparRange, ode_method=ode_method)
+
+    np.testing.assert_allclose(result["cvar"], rk45["cvar"], rtol=1e-2)
+
+
+def test_tabulated_cooling_curve(geometry, constants):
+    # Including LfuncN, which switches on like sqrt(T - 1)
+    constants["Lfunc"] = LfuncN
+    si, _ = _simulation_inputs(
+        constants, RADIOS, geometry, [0.0], "impurity_frac", 0, 1e-3, 1e-2, 1, 20
+    )
+    assert isinstance(si.Lfunc, CoolingCurveTable)
+
+
+def test_lengfunc_jacobian(geometry, constants):
+    si, _ = _simulation_inputs(
+        constants, RADIOS, geometry, [0.0], "impurity_frac", 0, 1e-3, 1e-2, 1, 20
+    )
+    st = SimulationState(si)
+    st.Tu, st.cvar = 100.0, 0.004
+    st.cz, st.nu, st.qradial = control_parameters(si, st.cvar)
+
+    for s, y in [(1.0, [1e7, 3.0]), (5.0, [5e7, 20.0])]:
+        numerical = []
+        for k in range(2):
+            dy = np.zeros(2)
+            dy[k] = 1e-6 * y[k]
+            df = np.subtract(LengFunc(s, y + dy, si, st), LengFunc(s, y - dy, si, st))
+            numerical.append(df / (2 * dy[k]))
+        np.testing.assert_allclose(
+            LengFuncJacobian(s, y, si, st), np.transpose(numerical), rtol=1e-3
+        )